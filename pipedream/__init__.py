@@ -1,4 +1,15 @@
-from .app import Application
-from .camera import CameraFeed
-from .controller import ControllerHandler
-from .gyroscope import GyroscopeHandler
+import importlib
+
+# Name: module, imported on first use so a camera process doesn't import the controller and claim the GPIO pins
+EXPORTS = {
+    "Application": ".app",
+    "CameraFeed": ".camera",
+    "ControllerHandler": ".controller",
+    "GyroscopeHandler": ".gyroscope",
+    "ProcessCameraFeed": ".sharedcamera",
+}
+
+def __getattr__(name):
+    if name not in EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(EXPORTS[name], __name__), name)
@@ -0,0 +1,86 @@
+import itertools
+
+# Axis: (command for negative thrust, command for positive thrust)
+ALLOCATION_AXES = {
+    "surge": ("Backwards Translation", "Forward Translation"),
+    "sway": ("Left Translation", "Right Translation"),
+    "heave": ("Descend", "Ascend"),
+    "yaw": ("Right Yaw", "Left Yaw"),
+    "pitch": ("Pitch Down", "Pitch Up"),
+    "roll": ("Roll Left", "Roll Right"),
+}
+
+class ThrustAllocator:
+    def __init__(self, valves, axes=ALLOCATION_AXES):
+        # valves is a ValveManager, the table uses its bit per solenoid line
+        self.axes = list(axes)
+        self.weights = [3 ** index for index in range(len(self.axes))]
+        self.center = sum(self.weights) # Index of the all-zero request
+
+        # Command: offset it adds to the table index, opposing commands cancel out
+        self.offsets = {}
+        self.signs = {} # Command: (axis index, -1 or 1)
+        for index, (weight, (negative, positive)) in enumerate(zip(self.weights, axes.values())):
+            self.offsets[negative] = -weight
+            self.offsets[positive] = weight
+            self.signs[negative] = (index, -1)
+            self.signs[positive] = (index, 1)
+
+        # Effect of each line on each axis, read from which command groups it belongs to
+        self.effects = {}
+        for bit in valves.bits.values():
+            effect = []
+            for negative, positive in axes.values():
+                inNegative = bool(valves.commandMasks.get(negative, 0) & bit)
+                inPositive = bool(valves.commandMasks.get(positive, 0) & bit)
+                effect.append(inPositive - inNegative)
+            self.effects[bit] = effect
+
+        self.table, self.conflicts = self.build_table()
+
+    def build_table(self):
+        # Index: net mask, and the lines dropped because they fight a requested axis
+        size = 3 ** len(self.axes)
+        table = [0] * size
+        conflicts = [0] * size
+        for request in itertools.product((-1, 0, 1), repeat=len(self.axes)):
+            index = self.center + sum(sign * weight for sign, weight in zip(request, self.weights))
+            mask = 0
+            dropped = 0
+            for bit, effect in self.effects.items():
+                helps = any(sign and sign == value for sign, value in zip(request, effect))
+                if not helps:
+                    continue
+                # A line pushing against any requested axis is never opened
+                if any(sign and sign == -value for sign, value in zip(request, effect)):
+                    dropped |= bit
+                else:
+                    mask |= bit
+            table[index] = mask
+            conflicts[index] = dropped
+        return table, conflicts
+
+    def index(self, commands):
+        index = self.center
+        for command in commands:
+            index += self.offsets[command]
+        return index
+
+    def allocate(self, commands):
+        # Active commands to the net mask of lines to open
+        return self.table[self.index(commands)]
+
+    def request(self, commands):
+        # Commands to -1, 0 or 1 per axis, opposing commands cancel out
+        request = [0] * len(self.axes)
+        for command in commands:
+            index, sign = self.signs[command]
+            request[index] += sign
+        return [(value > 0) - (value < 0) for value in request]
+
+    def lookup(self, request):
+        # request holds -1, 0 or 1 per axis, in ALLOCATION_AXES order
+        return self.table[self.center + sum(sign * weight for sign, weight in zip(request, self.weights))]
+
+    def dropped(self, commands):
+        return self.conflicts[self.index(commands)]
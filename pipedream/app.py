@@ -1,57 +1,182 @@
+import os
+import threading
+import time
 import tkinter as tk
+from .attitude import MadgwickFilter
+from .bus import TelemetryBus
 from .camera import CameraFeed
-from .controller import ControllerHandler
+from .controller import COMMANDS, ControllerHandler
 from .gyroscope import GyroscopeHandler
+from .sharedcamera import ProcessCameraFeed
+from .stability import AttitudeHold
+from .thrust import ThrustScheduler
+from .valves import ValveManager
+from .vision import OpticalFlowEstimator
+
+# Bus topic: gyroscope table labels
+GYRO_KEYS = {
+    "imu.accel": ["ax", "ay", "az"], # Acceleration
+    "imu.gyro": ["gx", "gy", "gz"], # Angular Velocity
+    "imu.angle": ["pitch", "roll", "yaw"], # Angle
+    "vision.flow": ["vx", "vy", "pts"], # Optical Flow
+}
+
+MIN_DISPLAY_FPS = 2
+COMMAND_INTERVAL = 20 # ms between command table refreshes
+
+class CameraView:
+    def __init__(self, root, name, camera, label, displayFps=30):
+        self.root = root
+        self.name = name
+        self.camera = camera
+        self.label = label
+        self.displayFps = displayFps # Budget when focused
+        self.displayRate = displayFps # Current rate, lowered to stay within the CPU budget
+
+    def update(self):
+        self.camera.update_label(self.label)
+        self.root.after(max(1, int(1000 / self.displayRate)), self.update)
+
+    def stats(self):
+        stats = self.camera.stats()
+        stats["displayFps"] = self.displayFps
+        stats["displayRate"] = self.displayRate
+        return stats
 
 class Application:
-    def __init__(self, root, useCamera, useGyro, useController):
+    def __init__(self, root, useCamera, useGyro, useController, gyroDisplayRate=30, cameraOptions=None, cameraSources=None, cpuBudget=0.5, useFlow=0, useAttitude=0, thrustPeriod=None, core=None, gyroOptions=None, controllerDevice=None, valveChip=0, valveLines=None):
         # Enable Modules
         self.useCamera = useCamera
         self.useGyro = useGyro
         self.useController = useController
+        self.useFlow = useFlow and useCamera
+        self.useAttitude = useAttitude and useGyro
+        self.gyroInterval = max(1, int(1000 / gyroDisplayRate)) # ms between table refreshes
+
+        # Fused attitude replaces the sensor's own angles in the table
+        self.gyroKeys = dict(GYRO_KEYS)
+        if self.useAttitude:
+            self.gyroKeys["imu.attitude"] = self.gyroKeys.pop("imu.angle")
+
+        # Devices publish here, the GUI reads on its own schedule so it never slows them down
+        self.bus = TelemetryBus()
         
+        self.core = core # DeviceCore driving the devices from one asyncio loop, threads when None
+        self.hold = None
+        self.thrust = None
+        self.valves = None
+
         # Create GUI
         self.root = root
         self.root.title("Pipedream Satellite GUI")
         
         # Camera
         if self.useCamera:
-            # Video Label
-            self.videoLabel = tk.Label(self.root, text="Live Fishing Camera Feed")
-            self.videoLabel.grid(row=0, column=1, padx=5, pady=5)
-
             # Taken Image
             self.imageLabel = tk.Label(self.root, text="Taken Image")
             self.imageLabel.grid(row=1, column=1, padx=5, pady=5)
+
+            # Writer, encoder and burst threads report through the bus, only the newest status is shown
+            self.savedUpdates = self.bus.subscribe("camera.saved")
+            self.refresh_saved_label()
             
-            # Camera Handler
-            self.camera = CameraFeed()
-            self.update_video()
+            # One capture pipeline and video label per source
+            self.cameras = []
+            for i, source in enumerate(cameraSources or [0]):
+                options = dict(cameraOptions or {})
+                options.update(source if isinstance(source, dict) else {"cameraIndex": source})
+                name = options.pop("name", f"Camera {i}")
+                displayFps = options.pop("displayFps", 30)
+
+                # Video Label
+                videoLabel = tk.Label(self.root, text="Live Fishing Camera Feed", highlightthickness=2)
+                videoLabel.grid(row=0, column=1 + i, padx=5, pady=5)
+                videoLabel.bind("<Button-1>", lambda event, index=i: self.focus_camera(index))
+
+                # Camera Handler
+                cameraClass = ProcessCameraFeed if options.pop("useProcess", False) else CameraFeed
+                camera = cameraClass(bus=self.bus, **options)
+                if self.core:
+                    self.core.add_camera(camera)
+                else:
+                    camera.start()
+                self.cameras.append(CameraView(self.root, name, camera, videoLabel, displayFps))
+
+            # Adaptive display rates for feeds that aren't focused
+            self.cpuBudget = cpuBudget
+            self.lastCpuTime = self.cpu_time()
+            self.lastWallTime = time.monotonic()
+            self.focus_camera(0)
+            for view in self.cameras:
+                view.update()
+            self.root.after(1000, self.balance_cameras)
 
         # Controller
         if self.useController:
             # Controller Command Table
             self.create_command_table()
 
-            # Controller Handler
+            # Every source of valve commands shares one manager
+            self.valves = ValveManager(COMMANDS, lines=valveLines, chip=valveChip)
+
+            # Proportional joystick thrust
+            if thrustPeriod:
+                self.thrust = ThrustScheduler(self.valves, period=thrustPeriod)
+                self.thrust.start()
+
+            # Controller Handler, buttons and highlights arrive through the bus
             self.controller = ControllerHandler(
-                shutdownCallback=self.safe_shutdown,
-                captureCallback=self.capture_image,
-                commandCallback=self.highlight_command,
-                zeroGyroCallback=self.zero_gyro
+                thrustScheduler=self.thrust,
+                valveManager=self.valves,
+                device=controllerDevice,
+                bus=self.bus
             )
-            self.controller.start()
+            self.buttonQueue = self.bus.subscribe("cmd.button", mode="fifo", maxQueue=16)
+            self.commandUpdates = self.bus.subscribe(["cmd.active", "cmd.hold"])
+            self.highlightQueue = self.bus.subscribe("cmd.highlight", mode="fifo", maxQueue=64)
+            self.activeCommands = {"cmd.active": frozenset(), "cmd.hold": frozenset()}
+            self.highlighted = frozenset()
+            self.buttonActions = {
+                "Capture Image": self.capture_image if self.useCamera else None,
+                "Quit": self.safe_shutdown,
+                "Zero Gyro": (lambda: self.zero_gyro(1)) if self.useGyro else None,
+                "Reset Gyro": (lambda: self.zero_gyro(0)) if self.useGyro else None,
+                "Record Video": self.toggle_recording if self.useCamera else None,
+                "Attitude Hold": self.toggle_hold if self.useGyro else None,
+            }
+            self.pump_commands()
+            if self.core:
+                self.core.add_controller(self.controller)
+            else:
+                self.controller.start()
 
         # Gyroscope
-        if self.useGyro:
+        if self.useGyro or self.useFlow:
             # Gyroscope Table
             self.create_gyro_table()
-        
+            self.gyroUpdates = self.bus.subscribe(list(self.gyroKeys))
+            self.refresh_gyro_labels()
+
+        if self.useGyro:
             # Gyroscope Handler
             self.gyro = GyroscopeHandler(
-                dataCallback=self.update_gyro_labels,                
+                attitudeFilter=MadgwickFilter() if self.useAttitude else None,
+                bus=self.bus,
+                **(gyroOptions or {})
             )
-            self.gyro.start()
+            if self.core:
+                self.core.add_gyroscope(self.gyro)
+            else:
+                self.gyro.start()
+
+            # Closed loop attitude hold, toggled from the controller
+            if self.useController:
+                self.hold = AttitudeHold(self.gyro, self.valves, bus=self.bus)
+
+        # Optical Flow, reported through the gyroscope table
+        if self.useFlow:
+            self.flow = OpticalFlowEstimator(self.cameras[0].camera, bus=self.bus)
+            self.flow.start()
 
         # Clean Exit
         self.root.protocol("wmDeleteWINDOW", self.safe_shutdown)
@@ -71,6 +196,8 @@ class Application:
             ("Descend", "B"),
             ("Zero Gyro", "X"),
             ("Remove Zero", "Y"),
+            ("Record Video", "Left Stick Press"),
+            ("Attitude Hold", "Right Stick Press"),
             ("Forward Translation", "Left Stick Up"),
             ("Backwards Translation", "Left Stick Down"),
             ("Left Translation", "Left Stick Left"),
@@ -96,6 +223,10 @@ class Application:
             self.commandLabels[command] = (commandLabel, buttonLabel)
 
     def highlight_command(self, commandName, state):
+        # Hold and controller threads may call this, Tk widgets are only touched by pump_commands
+        if threading.current_thread() is not threading.main_thread():
+            self.bus.publish("cmd.highlight", (commandName, state))
+            return
         labels = self.commandLabels.get(commandName)
         if labels:
             commandLabel, buttonLabel = labels
@@ -106,6 +237,24 @@ class Application:
             else:
                 self.reset_label_color(commandLabel, buttonLabel)
 
+    def pump_commands(self):
+        # Runs on the Tk main loop, button actions in order and only the newest highlights
+        for message in self.buttonQueue.poll():
+            action = self.buttonActions.get(message.value)
+            if action:
+                action()
+        for message in self.highlightQueue.poll():
+            self.highlight_command(*message.value)
+        for message in self.commandUpdates.poll():
+            self.activeCommands[message.topic] = message.value
+        highlighted = self.activeCommands["cmd.active"] | self.activeCommands["cmd.hold"]
+        for command in self.highlighted - highlighted:
+            self.highlight_command(command, 0)
+        for command in highlighted - self.highlighted:
+            self.highlight_command(command, 1)
+        self.highlighted = highlighted
+        self.root.after(COMMAND_INTERVAL, self.pump_commands)
+
     def reset_label_color(self, commandLabel, buttonLabel):
             commandLabel.config(bg=self.commandFrame["bg"], fg="black")
             buttonLabel.config(bg=self.commandFrame["bg"], fg="black")
@@ -126,21 +275,30 @@ class Application:
         self.angleFrame = tk.Frame(self.mainGyroFrame, borderwidth=1, relief="groove", width=150, height=100)
         self.angleFrame.grid(row=2, column=0, padx=5, pady=5)
         self.angleFrame.grid_propagate(False)
+
+        if self.useFlow:
+            self.flowFrame = tk.Frame(self.mainGyroFrame, borderwidth=1, relief="groove", width=150, height=100)
+            self.flowFrame.grid(row=3, column=0, padx=5, pady=5)
+            self.flowFrame.grid_propagate(False)
         
         # Container for dynamic updates from gyroscope handler
         self.gyroLabels = {}
+        self.gyroText = {} # Text currently shown by each label
         
         # Create gyroscope unit labels
         self.gyroUnits = {
                 "ax": "m/s^2", "ay": "m/s^2", "az": "m/s^2",
                 "gx": "deg/s", "gy": "deg/s", "gz": "deg/s",
-                "pitch": "deg", "roll": "deg", "yaw": "deg" 
+                "pitch": "deg", "roll": "deg", "yaw": "deg",
+                "vx": "m/s", "vy": "m/s", "pts": ""
         }
         
         # Populate data sections
         self.populate_gyro_section(self.accFrame, "Acceleration", ["ax", "ay", "az"])
         self.populate_gyro_section(self.gyroFrame, "Angular Velocity", ["gx", "gy", "gz"])
         self.populate_gyro_section(self.angleFrame, "Angle", ["pitch", "roll", "yaw"])
+        if self.useFlow:
+            self.populate_gyro_section(self.flowFrame, "Optical Flow", ["vx", "vy", "pts"])
 
     def populate_gyro_section(self, frame, title, labels): 
         # Header
@@ -157,39 +315,119 @@ class Application:
             
             self.gyroLabels[label] = valueLabel
     
-    def update_gyro_labels(self, dtype, values):
-        if dtype == 0x51: # Acceleration
-                keys = ["ax", "ay", "az"]
-        elif dtype == 0x52: # Angular Velocity
-                keys = ["gx", "gy", "gz"]
-        elif dtype == 0x53: # Angle
-                keys = ["pitch", "roll", "yaw"]
-        else:
-                return
-        
-        for key, value in zip(keys, values):
-                if key in self.gyroLabels:
+    def refresh_gyro_labels(self):
+        # Runs on the Tk main loop at the display rate, only the newest reading of each topic
+        for message in self.gyroUpdates.poll():
+                for key, value in zip(self.gyroKeys[message.topic], message.value):
                         unit = self.gyroUnits.get(key, "")
-                        self.gyroLabels[key].config(text=f"{value:.2f} {unit}")
+                        text = f"{value:.2f} {unit}"
+                        if self.gyroText.get(key) != text:
+                                self.gyroLabels[key].config(text=text)
+                                self.gyroText[key] = text
+        self.root.after(self.gyroInterval, self.refresh_gyro_labels)
                         
     def zero_gyro(self, state):
             self.gyro.zero(state)
                         
-    def update_video(self):
-        self.camera.update_label(self.videoLabel)
-        self.root.after(30, self.update_video)
+    def toggle_hold(self):
+        if self.hold:
+            active = self.hold.toggle()
+            self.commandLabels["Attitude Hold"][0].config(text="Attitude Hold (on)" if active else "Attitude Hold")
+
+    def focus_camera(self, index):
+        self.focusedCamera = self.cameras[index]
+        self.camera = self.focusedCamera.camera
+        self.videoLabel = self.focusedCamera.label
+        for view in self.cameras:
+            view.label.config(highlightbackground="red" if view is self.focusedCamera else self.root["bg"])
+        self.focusedCamera.displayRate = self.focusedCamera.displayFps
+
+    def cpu_time(self):
+        # This process, children that have exited, and what live capture and marker children report
+        times = os.times()
+        cpuTime = times.user + times.system + times.children_user + times.children_system
+        return cpuTime + sum(view.camera.child_cpu_time() for view in self.cameras)
+
+    def balance_cameras(self):
+        # Fraction of the whole machine used by this process and its children over the last second
+        cpuTime = self.cpu_time()
+        wallTime = time.monotonic()
+        usage = (cpuTime - self.lastCpuTime) / ((wallTime - self.lastWallTime) * (os.cpu_count() or 1))
+        self.lastCpuTime = cpuTime
+        self.lastWallTime = wallTime
+        self.cpuUsage = usage
+
+        for view in self.cameras:
+            if view is self.focusedCamera:
+                view.displayRate = view.displayFps
+            elif usage > self.cpuBudget:
+                view.displayRate = max(MIN_DISPLAY_FPS, view.displayRate / 2)
+            elif usage < 0.8 * self.cpuBudget:
+                view.displayRate = min(view.displayFps, view.displayRate * 1.5)
+        self.root.after(1000, self.balance_cameras)
+
+    def bus_stats(self):
+        return self.bus.stats()
+
+    def camera_stats(self):
+        return {view.name: view.stats() for view in self.cameras}
 
     def capture_image(self):
-        self.camera.update_label(self.imageLabel)
-        self.camera.save_image()
+        # Save exactly what is on screen
+        frame = self.camera.displayedFrame
+        if frame is None:
+            return
+        self.camera.update_label(self.imageLabel, frame)
+        self.camera.save_image(frame, callback=self.image_saved)
+        self.camera.trigger_burst(callback=self.burst_saved)
+
+    def refresh_saved_label(self):
+        # Runs on the Tk loop, root.after from other threads needs mainloop() which DeviceCore never runs
+        for message in self.savedUpdates.poll():
+            self.imageLabel.config(text=message.value, compound="top")
+        self.root.after(COMMAND_INTERVAL, self.refresh_saved_label)
+
+    def image_saved(self, filepath, ok):
+        # Called from a writer thread
+        self.bus.publish("camera.saved", f"Saved {filepath}" if ok else "Capture failed")
     
+    def toggle_recording(self):
+        self.camera.toggle_recording(callback=self.video_saved)
+
+    def video_saved(self, filepath, frames):
+        # Called from the encoder thread
+        self.bus.publish("camera.saved", f"Saved {frames} frames to {filepath}")
+
+    def burst_saved(self, directory, count):
+        # Called from the burst writer thread
+        self.bus.publish("camera.saved", f"Saved {count} frames to {directory}")
+
     def safe_shutdown(self):
         self.root.after(0, self.on_close)
         
     def on_close(self):
+        if self.core:
+            # Device tasks finish first, the caller releases the devices once core.run() returns
+            self.core.stop()
+            return
+        self.release_devices()
+
+    def release_devices(self):
+        if self.useFlow:
+            self.flow.stop()
         if self.useCamera:
-            self.camera.release()
+            for view in self.cameras:
+                view.camera.release()
+        if self.hold:
+            self.hold.stop()
+        if self.thrust:
+            self.thrust.stop()
+        if self.valves:
+            self.valves.close()
         if self.useGyro:
             self.gyro.stop()
-        self.root.quit()
-        self.root.destroy()
+        try:
+            self.root.quit()
+            self.root.destroy()
+        except tk.TclError:
+            pass # Window already closed
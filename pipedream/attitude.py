@@ -0,0 +1,214 @@
+import math
+from .decoder import DTYPE, TIMESTAMP, X, Y, Z
+
+# Data type used for filter output on the gyroscope style callback
+ATTITUDE_TYPE = "attitude"
+
+ACCEL_TYPE = 0x51
+GYRO_TYPE = 0x52
+MAG_TYPE = 0x54
+
+def wrap_angle(angle):
+    # Degrees into [-180, 180)
+    return (angle + 180.0) % 360.0 - 180.0
+
+def quat_multiply(a, b):
+    aw, ax, ay, az = a
+    bw, bx, by, bz = b
+    return (
+        aw * bw - ax * bx - ay * by - az * bz,
+        aw * bx + ax * bw + ay * bz - az * by,
+        aw * by - ax * bz + ay * bw + az * bx,
+        aw * bz + ax * by - ay * bx + az * bw,
+    )
+
+def quat_conjugate(q):
+    return (q[0], -q[1], -q[2], -q[3])
+
+def quat_to_euler(q):
+    # Degrees about x, y, z, same order as the sensor's 0x53 angle packet
+    w, x, y, z = q
+    angleX = math.atan2(2.0 * (w * x + y * z), 1.0 - 2.0 * (x * x + y * y))
+    angleY = math.asin(max(-1.0, min(1.0, 2.0 * (w * y - z * x))))
+    angleZ = math.atan2(2.0 * (w * z + x * y), 1.0 - 2.0 * (y * y + z * z))
+    return [math.degrees(angleX), math.degrees(angleY), math.degrees(angleZ)]
+
+class MadgwickFilter:
+    def __init__(self, beta=0.1, sampleRate=None, useMagnetometer=True):
+        self.beta = beta # Gradient descent gain, higher trusts the accelerometer more
+        self.sampleRate = sampleRate # Hz, estimated from batch timestamps when None
+        self.useMagnetometer = useMagnetometer
+        self.q = (1.0, 0.0, 0.0, 0.0)
+        self.tareInverse = (1.0, 0.0, 0.0, 0.0)
+
+        # Latest accelerometer and magnetometer readings, paired with the next gyro sample
+        self.accel = None
+        self.mag = None
+
+        # Sample period, fixed or smoothed estimate
+        self.dt = 1.0 / sampleRate if sampleRate else 0.01
+        self.lastTimestamp = None
+
+        # Statistics
+        self.updates = 0
+
+    def update(self, gyro, accel, mag=None, dt=None):
+        # gyro in deg/s, accel and mag in any unit, both are normalised
+        dt = dt or self.dt
+        gx, gy, gz = (math.radians(v) for v in gyro)
+        q0, q1, q2, q3 = self.q
+
+        # Rate of change of quaternion from the gyroscope
+        qDot0 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+        qDot1 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+        qDot2 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+        qDot3 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+
+        ax, ay, az = accel if accel else (0.0, 0.0, 0.0)
+        norm = math.sqrt(ax * ax + ay * ay + az * az)
+        if norm:
+            ax /= norm
+            ay /= norm
+            az /= norm
+            if mag and any(mag):
+                s0, s1, s2, s3 = self.marg_step(q0, q1, q2, q3, ax, ay, az, mag)
+            else:
+                s0, s1, s2, s3 = self.imu_step(q0, q1, q2, q3, ax, ay, az)
+            norm = math.sqrt(s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3)
+            if norm:
+                qDot0 -= self.beta * s0 / norm
+                qDot1 -= self.beta * s1 / norm
+                qDot2 -= self.beta * s2 / norm
+                qDot3 -= self.beta * s3 / norm
+
+        q0 += qDot0 * dt
+        q1 += qDot1 * dt
+        q2 += qDot2 * dt
+        q3 += qDot3 * dt
+        norm = math.sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3)
+        self.q = (q0 / norm, q1 / norm, q2 / norm, q3 / norm)
+        self.updates += 1
+        return self.q
+
+    def imu_step(self, q0, q1, q2, q3, ax, ay, az):
+        # Gradient of the gravity error
+        _2q0 = 2.0 * q0
+        _2q1 = 2.0 * q1
+        _2q2 = 2.0 * q2
+        _2q3 = 2.0 * q3
+        _4q0 = 4.0 * q0
+        _4q1 = 4.0 * q1
+        _4q2 = 4.0 * q2
+        _8q1 = 8.0 * q1
+        _8q2 = 8.0 * q2
+        q0q0 = q0 * q0
+        q1q1 = q1 * q1
+        q2q2 = q2 * q2
+        q3q3 = q3 * q3
+        return (
+            _4q0 * q2q2 + _2q2 * ax + _4q0 * q1q1 - _2q1 * ay,
+            _4q1 * q3q3 - _2q3 * ax + 4.0 * q0q0 * q1 - _2q0 * ay - _4q1 + _8q1 * q1q1 + _8q1 * q2q2 + _4q1 * az,
+            4.0 * q0q0 * q2 + _2q0 * ax + _4q2 * q3q3 - _2q3 * ay - _4q2 + _8q2 * q1q1 + _8q2 * q2q2 + _4q2 * az,
+            4.0 * q1q1 * q3 - _2q1 * ax + 4.0 * q2q2 * q3 - _2q2 * ay,
+        )
+
+    def marg_step(self, q0, q1, q2, q3, ax, ay, az, mag):
+        mx, my, mz = mag
+        norm = math.sqrt(mx * mx + my * my + mz * mz)
+        mx /= norm
+        my /= norm
+        mz /= norm
+
+        _2q0mx = 2.0 * q0 * mx
+        _2q0my = 2.0 * q0 * my
+        _2q0mz = 2.0 * q0 * mz
+        _2q1mx = 2.0 * q1 * mx
+        _2q0 = 2.0 * q0
+        _2q1 = 2.0 * q1
+        _2q2 = 2.0 * q2
+        _2q3 = 2.0 * q3
+        _2q0q2 = 2.0 * q0 * q2
+        _2q2q3 = 2.0 * q2 * q3
+        q0q0 = q0 * q0
+        q0q1 = q0 * q1
+        q0q2 = q0 * q2
+        q0q3 = q0 * q3
+        q1q1 = q1 * q1
+        q1q2 = q1 * q2
+        q1q3 = q1 * q3
+        q2q2 = q2 * q2
+        q2q3 = q2 * q3
+        q3q3 = q3 * q3
+
+        # Earth's magnetic field direction, only the horizontal and vertical parts matter
+        hx = mx * q0q0 - _2q0my * q3 + _2q0mz * q2 + mx * q1q1 + _2q1 * my * q2 + _2q1 * mz * q3 - mx * q2q2 - mx * q3q3
+        hy = _2q0mx * q3 + my * q0q0 - _2q0mz * q1 + _2q1mx * q2 - my * q1q1 + my * q2q2 + _2q2 * mz * q3 - my * q3q3
+        _2bx = math.sqrt(hx * hx + hy * hy)
+        _2bz = -_2q0mx * q2 + _2q0my * q1 + mz * q0q0 + _2q1mx * q3 - mz * q1q1 + _2q2 * my * q3 - mz * q2q2 + mz * q3q3
+        _4bx = 2.0 * _2bx
+        _4bz = 2.0 * _2bz
+
+        # Gradient of the gravity and magnetic field errors
+        fx = 2.0 * q1q3 - _2q0q2 - ax
+        fy = 2.0 * q0q1 + _2q2q3 - ay
+        fz = 1.0 - 2.0 * q1q1 - 2.0 * q2q2 - az
+        bx = _2bx * (0.5 - q2q2 - q3q3) + _2bz * (q1q3 - q0q2) - mx
+        by = _2bx * (q1q2 - q0q3) + _2bz * (q0q1 + q2q3) - my
+        bz = _2bx * (q0q2 + q1q3) + _2bz * (0.5 - q1q1 - q2q2) - mz
+        return (
+            -_2q2 * fx + _2q1 * fy - _2bz * q2 * bx + (-_2bx * q3 + _2bz * q1) * by + _2bx * q2 * bz,
+            _2q3 * fx + _2q0 * fy - 4.0 * q1 * fz + _2bz * q3 * bx + (_2bx * q2 + _2bz * q0) * by + (_2bx * q3 - _4bz * q1) * bz,
+            -_2q0 * fx + _2q3 * fy - 4.0 * q2 * fz + (-_4bx * q2 - _2bz * q0) * bx + (_2bx * q1 + _2bz * q3) * by + (_2bx * q0 - _4bz * q2) * bz,
+            _2q1 * fx + _2q2 * fy + (-_4bx * q3 + _2bz * q1) * bx + (-_2bx * q0 + _2bz * q2) * by + _2bx * q1 * bz,
+        )
+
+    def update_batch(self, samples):
+        # samples is a decode_batch() array, one filter step per gyro row
+        return self.update_rows(samples.tolist())
+
+    def update_rows(self, rows):
+        # Same columns as decode_batch(), as lists
+        if not rows:
+            return self.q
+
+        if not self.sampleRate:
+            # Every read shares one timestamp, spread the time since the last read over its gyro rows
+            timestamp = rows[0][TIMESTAMP]
+            count = sum(1 for row in rows if row[DTYPE] == GYRO_TYPE)
+            if self.lastTimestamp is not None and count:
+                estimate = (timestamp - self.lastTimestamp) / count
+                if 0.0 < estimate < 0.1:
+                    self.dt = 0.9 * self.dt + 0.1 * estimate
+            if count:
+                self.lastTimestamp = timestamp
+
+        for row in rows:
+            dtype = row[DTYPE]
+            if dtype == GYRO_TYPE:
+                self.update((row[X], row[Y], row[Z]), self.accel, self.mag)
+            elif dtype == ACCEL_TYPE:
+                self.accel = (row[X], row[Y], row[Z])
+            elif dtype == MAG_TYPE and self.useMagnetometer:
+                self.mag = (row[X], row[Y], row[Z])
+        return self.q
+
+    def tare(self):
+        # Current attitude becomes the reference, valid through any yaw wrap
+        self.tareInverse = quat_conjugate(self.q)
+
+    def clear_tare(self):
+        self.tareInverse = (1.0, 0.0, 0.0, 0.0)
+
+    @property
+    def quaternion(self):
+        # Attitude relative to the tare reference
+        return quat_multiply(self.tareInverse, self.q)
+
+    def angles(self):
+        return quat_to_euler(self.quaternion)
+
+    def reset(self):
+        self.q = (1.0, 0.0, 0.0, 0.0)
+        self.accel = None
+        self.mag = None
+        self.lastTimestamp = None
@@ -0,0 +1,117 @@
+import cv2
+import datetime
+import os
+import threading
+import time
+import numpy as np
+
+class FrameRing:
+    def __init__(self, shape, slots, preFrames, postFrames, directory="./images"):
+        self.shape = shape
+        self.slots = slots
+        self.preFrames = min(preFrames, slots - postFrames)
+        self.postFrames = postFrames
+        self.directory = directory
+
+        # All memory is allocated here, capture writes straight into the slots and bursts are saved from them
+        self.frames = np.empty((slots,) + shape, dtype=np.uint8)
+        self.timestamps = np.zeros(slots)
+        self.sequence = 0 # Frames written since start
+
+        self.triggerSequence = None
+        self.triggerTime = None
+        self.callback = None
+        self.flushing = False
+
+        # Burst being saved: next sequence the writer saves and the end of the window
+        self.condition = threading.Condition()
+        self.writeSequence = 0
+        self.flushEnd = 0
+
+        # Statistics
+        self.bursts = 0
+        self.rejectedTriggers = 0
+        self.stalls = 0 # Captures that waited for the writer to free a slot
+        self.stallTime = 0.0
+
+    @classmethod
+    def for_budget(cls, shape, fps, preSeconds, postSeconds, maxBytes, directory="./images"):
+        # Burst window plus as many spare slots, capture runs on into the spares while a burst is saved
+        frameBytes = int(np.prod(shape))
+        preFrames = int(round(preSeconds * fps))
+        postFrames = int(round(postSeconds * fps))
+        window = min(preFrames + postFrames, maxBytes // (2 * frameBytes))
+        if window < 1:
+            raise ValueError(f"Burst memory budget of {maxBytes} bytes is smaller than two frames")
+        postFrames = min(postFrames, window)
+        return cls(shape, 2 * window, window - postFrames, postFrames, directory)
+
+    @property
+    def nbytes(self):
+        return self.frames.nbytes
+
+    def slot(self):
+        # Capture only waits when the next slot holds a burst frame the writer hasn't saved yet
+        overwrites = self.sequence - self.slots
+        if self.flushing and self.writeSequence <= overwrites < self.flushEnd:
+            start = time.monotonic()
+            with self.condition:
+                while self.flushing and self.writeSequence <= overwrites < self.flushEnd:
+                    self.condition.wait()
+            self.stalls += 1
+            self.stallTime += time.monotonic() - start
+        return self.frames[self.sequence % self.slots]
+
+    def commit(self, timestamp):
+        self.timestamps[self.sequence % self.slots] = timestamp
+        self.sequence += 1
+        if self.triggerSequence is not None and self.sequence >= self.triggerSequence + self.postFrames:
+            self.flush()
+
+    def trigger(self, callback=None):
+        # One burst at a time
+        if self.flushing or self.triggerSequence is not None:
+            self.rejectedTriggers += 1
+            return False
+        self.triggerSequence = self.sequence
+        self.triggerTime = datetime.datetime.now()
+        self.callback = callback
+        return True
+
+    def flush(self):
+        # No copy, the writer saves the window straight from the ring
+        end = self.sequence
+        start = max(0, self.triggerSequence - self.preFrames, end - self.slots)
+        with self.condition:
+            self.writeSequence = start
+            self.flushEnd = end
+            self.flushing = True
+        thread = threading.Thread(target=self.write_burst, args=(start, end, self.triggerSequence, self.triggerTime, self.callback), daemon=True)
+        self.triggerSequence = None
+        thread.start()
+
+    def write_burst(self, start, end, triggerSequence, triggerTime, callback):
+        directory = os.path.join(self.directory, f"burst_{triggerTime.strftime('%Y%m%d-%H%M%S-%f')}")
+        os.makedirs(directory, exist_ok=True)
+
+        written = 0
+        triggerTimestamp = self.timestamps[min(triggerSequence, end - 1) % self.slots]
+        for sequence in range(start, end):
+            # Name frames by their offset from the trigger in milliseconds
+            index = sequence % self.slots
+            offset = int(round(1000 * (self.timestamps[index] - triggerTimestamp)))
+            filepath = os.path.join(directory, f"frame_{sequence - start:04d}_{offset:+06d}ms.jpg")
+            if cv2.imwrite(filepath, self.frames[index]):
+                written += 1
+
+            # Slot saved, capture may reuse it
+            with self.condition:
+                self.writeSequence = sequence + 1
+                self.condition.notify_all()
+
+        self.bursts += 1
+        with self.condition:
+            self.flushing = False
+            self.condition.notify_all()
+        if callback:
+            callback(directory, written)
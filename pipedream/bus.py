@@ -0,0 +1,163 @@
+import collections
+import threading
+import time
+
+# Topic: payload published on it
+TOPICS = {
+    "imu.accel": "[ax, ay, az] m/s^2, zeroed",
+    "imu.gyro": "[gx, gy, gz] deg/s, zeroed",
+    "imu.angle": "[x, y, z] deg from the sensor, zeroed",
+    "imu.attitude": "[x, y, z] deg from the attitude filter, tared",
+    "imu.samples": "decode_batch() array of one serial read, zeroed",
+    "vision.flow": "[vx, vy, features] from optical flow",
+    "cmd.active": "frozenset of highlighted pilot commands",
+    "cmd.hold": "frozenset of commands fired by attitude hold",
+    "cmd.button": "command label of a pressed action button",
+    "cmd.highlight": "(command, state) highlight requested from outside the Tk loop",
+    "camera.saved": "status text once an image, burst or video is written",
+    "camera.frame": "(camera, frame, timestamp, sequence), frame may be a reused buffer",
+}
+
+Message = collections.namedtuple("Message", "topic value timestamp")
+
+class Subscription:
+    def __init__(self, topics, mode="latest", maxQueue=64, dropPolicy="oldest"):
+        if mode not in ("latest", "fifo"):
+            raise ValueError(f"Unknown subscription mode {mode}, expected 'latest' or 'fifo'")
+        if dropPolicy not in ("oldest", "newest"):
+            raise ValueError(f"Unknown drop policy {dropPolicy}, expected 'oldest' or 'newest'")
+        self.topics = topics
+        self.mode = mode
+        self.maxQueue = maxQueue
+        self.dropPolicy = dropPolicy
+        self.condition = threading.Condition()
+
+        # Latest mode keeps one message per topic, FIFO mode a bounded queue
+        self.latest = {}
+        self.queue = collections.deque()
+
+        # Statistics
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0 # FIFO overflow, or a latest value replaced before it was read
+
+    def put(self, message):
+        # Producer side, never blocks
+        with self.condition:
+            self.received += 1
+            if self.mode == "latest":
+                if message.topic in self.latest:
+                    self.dropped += 1
+                self.latest[message.topic] = message
+            else:
+                if len(self.queue) >= self.maxQueue:
+                    self.dropped += 1
+                    if self.dropPolicy == "newest":
+                        return
+                    self.queue.popleft()
+                self.queue.append(message)
+            self.condition.notify()
+
+    def poll(self):
+        # Everything waiting, without blocking
+        with self.condition:
+            return self.take()
+
+    def get(self, timeout=None):
+        # Blocks until something arrives, for consumers with their own thread
+        with self.condition:
+            if not self.latest and not self.queue:
+                self.condition.wait(timeout)
+            return self.take()
+
+    def take(self):
+        if self.mode == "latest":
+            messages = list(self.latest.values())
+            self.latest.clear()
+        else:
+            messages = list(self.queue)
+            self.queue.clear()
+        self.delivered += len(messages)
+        return messages
+
+    def stats(self):
+        return {
+            "topics": list(self.topics),
+            "mode": self.mode,
+            "received": self.received,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "pending": len(self.latest) + len(self.queue),
+        }
+
+class TelemetryBus:
+    def __init__(self, topics=TOPICS):
+        self.topics = topics
+        self.lock = threading.Lock()
+        self.subscribers = {topic: () for topic in topics} # Topic: subscriptions, replaced on change
+
+        # Publish counts per producer thread, so counting needs no lock. Every topic is there from the start,
+        # stats() can read them while their threads keep counting
+        self.local = threading.local()
+        self.counters = []
+
+    def subscribe(self, topics, mode="latest", maxQueue=64, dropPolicy="oldest"):
+        # topics is a name, a list of names, or a prefix ending in ".*"
+        names = self.match(topics)
+        subscription = Subscription(names, mode, maxQueue, dropPolicy)
+        with self.lock:
+            for name in names:
+                self.subscribers[name] = self.subscribers[name] + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for name in subscription.topics:
+                self.subscribers[name] = tuple(s for s in self.subscribers[name] if s is not subscription)
+
+    def match(self, topics):
+        if isinstance(topics, str):
+            topics = [topics]
+        names = []
+        for topic in topics:
+            if topic.endswith(".*"):
+                matches = [name for name in self.topics if name.startswith(topic[:-1])]
+            else:
+                matches = [topic] if topic in self.topics else []
+            if not matches:
+                raise ValueError(f"Unknown topic {topic}, expected one of {sorted(self.topics)}")
+            names.extend(name for name in matches if name not in names)
+        return names
+
+    def publish(self, topic, value, timestamp=None):
+        # Copy-on-write subscriber tuples, publishing takes no lock
+        subscribers = self.subscribers[topic]
+        counts = getattr(self.local, "counts", None)
+        if counts is None:
+            counts = self.local.counts = dict.fromkeys(self.topics, 0)
+            with self.lock:
+                self.counters.append(counts)
+        counts[topic] += 1
+        if not subscribers:
+            return
+        message = Message(topic, value, time.monotonic() if timestamp is None else timestamp)
+        for subscription in subscribers:
+            subscription.put(message)
+
+    def published(self):
+        # Totals over every producer thread, topics never published left out
+        totals = collections.Counter()
+        with self.lock:
+            for counts in self.counters:
+                totals.update(counts)
+        return {topic: count for topic, count in totals.items() if count}
+
+    def stats(self):
+        subscriptions = []
+        for subscribers in self.subscribers.values():
+            subscriptions.extend(s for s in subscribers if s not in subscriptions)
+        return {
+            "published": self.published(),
+            "subscribers": {topic: len(subscribers) for topic, subscribers in self.subscribers.items() if subscribers},
+            "subscriptions": [subscription.stats() for subscription in subscriptions],
+        }
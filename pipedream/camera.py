@@ -1,40 +1,219 @@
 import cv2
-import datetime
+import threading
+import time
+import warnings
 from PIL import Image, ImageTk
+from .burst import FrameRing
+from .display import FrameDisplay
+from .profiles import open_capture
+from .vision import MarkerDetector
+from .writer import ImageWriter, VideoRecorder
 
 class CameraFeed:
-    def __init__(self, cameraIndex=0):
-        self.cap = cv2.VideoCapture(cameraIndex)
+    def __init__(self, cameraIndex=0, profile=None, displaySize=None, imageDirectory="./images", burstSeconds=0, burstPostSeconds=1.0, burstMaxBytes=256 * 2**20,
+                 videoDirectory="./videos", recordQueue=60, recordDropPolicy="oldest", markerLength=None, markerWorkers=2, bus=None):
+        self.open(cameraIndex, profile)
+        for name, (requested, actual) in self.profileMismatches.items():
+            warnings.warn(f"Camera profile {profile}: requested {name}={requested}, got {actual}")
+
+        self.running = False
+        self.thread = None
+        self.bus = bus
+
+        # Single slot, each capture replaces the previous frame
+        self.latest = (None, 0.0, 0) # frame, timestamp, sequence
+        self.displayedSequence = 0
+        self.displayedFrame = None # Last frame shown on the video label
+
+        # Label: FrameDisplay, each keeps its own buffers and PhotoImage
+        self.displaySize = displaySize
+        self.displays = {}
+
+        # Stills are encoded and written off the GUI thread
+        self.writer = ImageWriter(imageDirectory)
+        self.imageDirectory = imageDirectory
+
+        # Pre-trigger burst ring, allocated once the frame size is known
+        self.burstSeconds = burstSeconds
+        self.burstPostSeconds = burstPostSeconds
+        self.burstMaxBytes = burstMaxBytes
+        self.ring = None
+
+        # Continuous recording, encoded on its own thread
+        self.recorder = VideoRecorder(videoDirectory, self.fps, recordQueue, recordDropPolicy)
+
+        # Docking marker pose estimation in a worker pool
+        self.detector = MarkerDetector(markerLength, workers=markerWorkers) if markerLength else None
+
+        # Statistics
+        self.capturedFrames = 0
+        self.droppedFrames = 0 # Captured but never displayed
+        self.captureFps = 0.0
+        self.frameAge = 0.0 # Seconds between capture and display
+        self.windowStart = time.monotonic()
+        self.windowFrames = 0
+
+    def open(self, cameraIndex, profile):
+        self.cap, self.profileMismatches = open_capture(cameraIndex, profile)
         if not self.cap.isOpened():
             raise Exception("Camera not found")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    @property
+    def reusesFrames(self):
+        # Frames live in reused buffers, consumers that keep them need a copy
+        return self.ring is not None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.capture_loop, daemon=True)
+        self.thread.start()
+
+    def capture_loop(self):
+        while self.running:
+            ret, frame, timestamp = self.read_frame()
+            if not ret:
+                time.sleep(0.01)
+                continue
+            self.publish_frame(frame, timestamp)
+
+    def publish_frame(self, frame, timestamp):
+        # Hand a captured frame to the display slot, burst ring, recorder and detector
+        now = time.monotonic()
+        if self.ring:
+            self.ring.commit(timestamp)
+        self.capturedFrames += 1
+        self.latest = (frame, timestamp, self.capturedFrames)
+        if self.bus:
+            self.bus.publish("camera.frame", (self, frame, timestamp, self.capturedFrames))
+
+        if self.recorder.recording:
+            self.recorder.push(frame.copy() if self.reusesFrames else frame)
+        if self.detector:
+            self.detector.submit(frame, timestamp)
 
-    def get_frame(self):
-        ret, frame = self.cap.read()
-        if not ret:
+        self.windowFrames += 1
+        if now - self.windowStart >= 1.0:
+            self.captureFps = self.windowFrames / (now - self.windowStart)
+            self.windowStart = now
+            self.windowFrames = 0
+
+    def read_frame(self):
+        if self.ring is None:
+            ret, frame = self.cap.read()
+            if ret and self.burstSeconds > 0:
+                self.create_ring(frame)
+            return ret, frame, time.monotonic()
+
+        # Decode straight into the next ring slot
+        slot = self.ring.slot()
+        ret, frame = self.cap.read(slot)
+        if ret and frame is not slot:
+            if frame.shape != slot.shape:
+                return False, None, 0.0
+            slot[...] = frame
+        return ret, slot, time.monotonic()
+
+    def create_ring(self, frame):
+        self.ring = FrameRing.for_budget(frame.shape, self.fps, self.burstSeconds, self.burstPostSeconds,
+                                         self.burstMaxBytes, self.imageDirectory)
+
+    def trigger_burst(self, callback=None):
+        if self.ring is None:
+            return False
+        return self.ring.trigger(callback)
+
+    def start_recording(self, filepath=None):
+        return self.recorder.start(filepath)
+
+    def stop_recording(self, callback=None):
+        return self.recorder.stop(callback)
+
+    def toggle_recording(self, callback=None):
+        # Returns immediately, callback(filepath, frames) runs on the encoder thread once the file is closed
+        if self.recorder.recording:
+            self.stop_recording(callback)
+        else:
+            self.start_recording()
+        return self.recorder.recording
+
+    def next_frame(self):
+        # Newest frame if it hasn't been displayed yet
+        frame, timestamp, sequence = self.latest
+        if frame is None or sequence == self.displayedSequence:
+            return None
+        if self.displayedSequence:
+            self.droppedFrames += sequence - self.displayedSequence - 1
+        self.displayedSequence = sequence
+        self.displayedFrame = frame
+        self.frameAge = time.monotonic() - timestamp
+        return frame
+
+    def get_frame(self, frame=None):
+        if frame is None:
+            frame = self.next_frame()
+        if frame is None:
             return None
         cv2image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         return Image.fromarray(cv2image)
 
-    def get_imageTk_frame(self):
-        image = self.get_frame()
+    def get_imageTk_frame(self, frame=None):
+        image = self.get_frame(frame)
         if image:
             return ImageTk.PhotoImage(image)
         return None
 
-    def update_label(self,label):
-        imgtk = self.get_imageTk_frame()
-        if imgtk:
-            label.imgtk = imgtk
-            label.config(image=imgtk)
+    def update_label(self,label, frame=None):
+        lines = None
+        if frame is None:
+            frame = self.next_frame()
+            if self.detector:
+                lines = self.detector.overlay_lines()
+        if frame is None:
+            return
 
-    def save_image(self):
-        ret, frame = self.cap.read()
+        display = self.displays.get(label)
+        if display is None:
+            display = self.displays[label] = FrameDisplay(label, self.displaySize)
+        display.show(frame, lines)
 
-        if ret:
-            timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
-            filepath = f"./images/image_{timestamp}.jpg"
+    def child_cpu_time(self):
+        # CPU used by live helper processes, which os.times() only counts after they exit
+        return self.detector.child_cpu_time() if self.detector else 0.0
 
-            cv2.imwrite(filepath, frame)
+    def stats(self):
+        return {
+            "captureFps": self.captureFps,
+            "capturedFrames": self.capturedFrames,
+            "droppedFrames": self.droppedFrames,
+            "frameAge": self.frameAge,
+            "recording": self.recorder.recording,
+            "recordedFrames": self.recorder.framesWritten,
+            "recordDroppedFrames": self.recorder.framesDropped,
+            "markers": self.detector.stats() if self.detector else None,
+        }
+
+    def save_image(self, frame=None, callback=None):
+        # Defaults to the frame the pilot is looking at
+        if frame is None:
+            frame = self.displayedFrame
+        if frame is None:
+            frame = self.latest[0]
+        if frame is None:
+            return None
+        if self.reusesFrames:
+            frame = frame.copy()
+        return self.writer.submit(frame, callback)
 
     def release(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        self.recorder.close()
+        if self.detector:
+            self.detector.close()
+        self.close()
+        self.writer.close()
+
+    def close(self):
         self.cap.release()
@@ -1,10 +1,103 @@
+import argparse
+import os
 import tkinter as tk
-from pipedream import Application
+from pipedream.core import DeviceCore
+from pipedream.profiles import PROFILES, probe_profiles
+from pipedream.simulation import FakeWitMotion, ScriptedGamepad, SyntheticCapture, stick_script
+
+def parse_size(text):
+    width, _, height = text.partition("x")
+    return int(width), int(height)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pipedream Satellite GUI")
+    parser.add_argument("--camera-profile", choices=sorted(PROFILES), default=None,
+                        help="V4L2 capture settings to negotiate with the camera")
+    parser.add_argument("--cameras", type=int, nargs="+", default=[0],
+                        help="Camera indexes to show, the first one starts focused")
+    parser.add_argument("--display-size", type=parse_size, default=(640, 480), metavar="WIDTHxHEIGHT",
+                        help="Largest size each feed is shown at, larger frames are downscaled before conversion")
+    parser.add_argument("--cpu-budget", type=float, default=0.5,
+                        help="Fraction of total CPU before unfocused feeds lower their display rate")
+    parser.add_argument("--markers", type=float, default=None, metavar="LENGTH",
+                        help="Detect ArUco docking markers of this side length (m) and overlay their pose")
+    parser.add_argument("--attitude", action="store_true",
+                        help="Fuse accelerometer and gyroscope readings into a quaternion attitude estimate")
+    parser.add_argument("--pwm-period", type=float, default=None, metavar="SECONDS",
+                        help="Scale joystick thrust with deflection by pulsing the valves over this period (e.g. 0.1)")
+    parser.add_argument("--flow", action="store_true",
+                        help="Estimate drift velocity from optical flow on the first camera")
+    parser.add_argument("--camera-process", action="store_true",
+                        help="Run camera capture in a separate process sharing frames through shared memory")
+    parser.add_argument("--asyncio", action="store_true",
+                        help="Drive the gamepad, gyroscope and cameras from one asyncio loop instead of a thread each")
+    parser.add_argument("--valve-chip", type=int, default=None, metavar="CHIP",
+                        help="Switch the valves with lgpio group writes on this gpiochip, lines numbered by GPIO (e.g. 4 on older Pi 5 kernels)")
+    parser.add_argument("--simulate", action="store_true",
+                        help="Run without the craft: mock GPIO pins, a scripted gamepad, a fake IMU on a pty and synthetic cameras")
+    parser.add_argument("--sim-video", default=None, metavar="PATH",
+                        help="With --simulate, loop this video file as every camera instead of generated frames")
+    parser.add_argument("--sim-imu-rate", type=float, default=100, metavar="HZ",
+                        help="With --simulate, packets per second of each type from the fake IMU")
+    parser.add_argument("--probe-camera", action="store_true",
+                        help="Measure achieved FPS and read time for each camera profile on every --cameras index, then exit")
+    return parser.parse_args()
+
+def probe_camera(cameraIndexes):
+    print(f"{'Camera':<7} {'Profile':<12} {'FPS':>6} {'Mean read':>10} {'Max read':>10}  Mismatches")
+    for cameraIndex in cameraIndexes:
+        for result in probe_profiles(cameraIndex):
+            mismatches = ", ".join(f"{name}={actual}" for name, (_, actual) in result["mismatches"].items())
+            print(f"{cameraIndex:<7} {result['profile']:<12} {result['fps']:>6.1f} {1000 * result['meanRead']:>8.1f}ms {1000 * result['maxRead']:>8.1f}ms  {mismatches or '-'}")
 
 def main():
+    args = parse_args()
+    if args.probe_camera:
+        probe_camera(args.cameras)
+        return
+
+    # Valve pins are claimed when the app is imported, so the pin factory has to be chosen first
+    if args.simulate:
+        os.environ.setdefault("GPIOZERO_PIN_FACTORY", "mock")
+    from pipedream import Application
+    from pipedream.controller import COMMANDS
+
+    # The Pi's own GPIO chips number their lines like the GPIOs, other chips need a lines map
+    valveLines = None
+    if args.valve_chip is not None:
+        valveLines = {device.pin.number: device.pin.number for group in COMMANDS.values() for device in group}
+
+    cameraSources = args.cameras
+    gyroOptions = None
+    controllerDevice = None
+    imu = None
+    if args.simulate:
+        # Same data rates as the craft: 125 Hz gamepad reports, IMU at the configured rate, cameras at their frame rate
+        imu = FakeWitMotion(rate=args.sim_imu_rate).start()
+        gyroOptions = {"port": imu.port}
+        controllerDevice = ScriptedGamepad(stick_script(2000), repeat=True)
+        cameraSources = [{"cameraIndex": SyntheticCapture(args.sim_video), "name": f"Simulated {index}"} for index in args.cameras]
+
     root = tk.Tk()
-    app = Application(root, useCamera=1, useGyro=1, useController=1)
-    root.mainloop()
+    core = DeviceCore(root) if args.asyncio else None
+    app = Application(root, useCamera=1, useGyro=1, useController=1,
+                      cameraOptions={"profile": args.camera_profile, "useProcess": args.camera_process,
+                                     "markerLength": args.markers, "displaySize": args.display_size},
+                      cameraSources=cameraSources, cpuBudget=args.cpu_budget, useFlow=args.flow,
+                      useAttitude=args.attitude, thrustPeriod=args.pwm_period, core=core,
+                      gyroOptions=gyroOptions, controllerDevice=controllerDevice,
+                      valveChip=args.valve_chip or 0, valveLines=valveLines)
+    try:
+        if core:
+            core.run()
+        else:
+            root.mainloop()
+    finally:
+        # Valves closed and recordings finalised even when a device task failed
+        if core:
+            app.release_devices()
+        if imu:
+            imu.stop()
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,8 @@
 import evdev
 import gpiozero
+import functools
 import threading
+from .valves import ValveManager
 
 # Identifier: [gpio(pins)]
 PINOUT = {
@@ -116,21 +118,65 @@ COMMANDS = {
 
 DEADZONE = 0.25
 
+# (Event type, event code): command, codes are listed in eventCodes.txt
+BUTTON_MAP = {
+    (evdev.ecodes.EV_KEY, evdev.ecodes.BTN_SELECT): "Capture Image",
+    (evdev.ecodes.EV_KEY, evdev.ecodes.BTN_START): "Quit",
+    (evdev.ecodes.EV_KEY, evdev.ecodes.BTN_TL): "Roll Left",
+    (evdev.ecodes.EV_KEY, evdev.ecodes.BTN_TR): "Roll Right",
+    (evdev.ecodes.EV_KEY, evdev.ecodes.BTN_A): "Ascend",
+    (evdev.ecodes.EV_KEY, evdev.ecodes.BTN_B): "Descend",
+    (evdev.ecodes.EV_KEY, evdev.ecodes.BTN_X): "Zero Gyro",
+    (evdev.ecodes.EV_KEY, evdev.ecodes.BTN_Y): "Reset Gyro",
+    (evdev.ecodes.EV_KEY, evdev.ecodes.BTN_THUMBL): "Record Video",
+    (evdev.ecodes.EV_KEY, evdev.ecodes.BTN_THUMBR): "Attitude Hold",
+    # Triggers can be read like buttons
+    (evdev.ecodes.EV_ABS, evdev.ecodes.ABS_Z): "Pitch Up",
+    (evdev.ecodes.EV_ABS, evdev.ecodes.ABS_RZ): "Pitch Down",
+}
+
+# Event types with handlers, MSC events are dropped before the lookup
+HANDLED_TYPES = frozenset((evdev.ecodes.EV_KEY, evdev.ecodes.EV_ABS))
+
+# Joystick axis: (command when deflected negative, command when deflected positive)
+STICK_AXES = {
+    evdev.ecodes.ABS_X: ("Left Translation", "Right Translation"),
+    evdev.ecodes.ABS_Y: ("Forward Translation", "Backwards Translation"),
+    evdev.ecodes.ABS_RX: ("Left Yaw", "Right Yaw"),
+}
+
 class ControllerHandler:
-    def __init__(self, shutdownCallback=None, captureCallback=None, commandCallback=None, zeroGyroCallback=None):
-        if shutdownCallback:
-            self.shutdown = shutdownCallback
-        if captureCallback:
-            self.capture = captureCallback
-        if commandCallback:
-            self.commandInput = commandCallback
-        if zeroGyroCallback:
-            self.zeroGyro = zeroGyroCallback
-        
-        self.activeLCommand = None # Left Joystick Input
-        self.activeRCommand = None # Right Joystick Input
+    def __init__(self, shutdownCallback=None, captureCallback=None, commandCallback=None, zeroGyroCallback=None, recordCallback=None, holdCallback=None, thrustScheduler=None, valveManager=None, buttonMap=BUTTON_MAP, device=None, bus=None):
+        self.shutdown = shutdownCallback
+        self.capture = captureCallback
+        self.commandInput = commandCallback
+        self.zeroGyro = zeroGyroCallback
+        self.record = recordCallback
+        self.hold = holdCallback
+        self.thrust = thrustScheduler # Proportional joystick thrust when set
+        self.valves = valveManager or ValveManager(COMMANDS)
+        self.bus = bus # TelemetryBus, consumers run on their own threads
+        self.proportionalCommands = set() # Highlighted proportional commands
+        self.pilotCommands = set() # Maneuvers currently requested by buttons and sticks
+        self.pilotChanged = False
+
+        # Axis events wait for the end of their report, only the last value of each is applied
+        self.pendingAxes = {}
+        self.pendingHighlights = {} # Command: state to show once the report is applied
+        self.highlighted = {} # Command: state last sent to commandCallback
+        self.dropping = False # Kernel buffer overran, events are ignored until the next SYN_REPORT
+
+        # Statistics
+        self.rawEvents = 0 # Key and axis events with a handler
+        self.appliedEvents = 0 # Handler calls after coalescing
+        self.reports = 0
+        self.decisions = 0 # Pilot requests sent to the valve manager
+        self.notifications = 0 # commandCallback calls
+        self.resyncs = 0 # SYN_DROPPED recoveries
         
-        self.controller = self.find_controller()
+        self.controller = device or self.find_controller()
+        self.buttonMap = buttonMap
+        self.dispatch = self.build_dispatch(buttonMap)
 
     def find_controller(self):
         for device in [evdev.InputDevice(path) for path in evdev.list_devices()]:
@@ -138,15 +184,26 @@ class ControllerHandler:
                 return device
         raise Exception("Controller not found")
 
+    def build_dispatch(self, buttonMap):
+        # (Event type, event code): handler taking the event value, built once
+        dispatch = {key: functools.partial(self.read_button_input, command=command) for key, command in buttonMap.items()}
+        stickHandler = self.read_proportional_input if self.thrust else self.read_stick_input
+        for code in STICK_AXES:
+            dispatch[(evdev.ecodes.EV_ABS, code)] = functools.partial(stickHandler, code)
+        return dispatch
+
     def start(self):
         thread = threading.Thread(target=self.controller_loop, daemon=True)
         thread.start()
     
     def read_button_input(self, value, command):
         if value > 0:
-            if self.commandInput:
-                self.commandInput(command, 1) # Highlight input
+            self.notify(command, 1) # Highlight input
             
+            # Action buttons go to bus subscribers as well as the callbacks
+            if self.bus and command not in COMMANDS:
+                self.bus.publish("cmd.button", command)
+
             # Handle buttons with callbacks
             if command == "Capture Image":
                 if self.capture:
@@ -160,108 +217,151 @@ class ControllerHandler:
             if command == "Reset Gyro":
                 if self.zeroGyro:
                     self.zeroGyro(0)   
+            if command == "Record Video":
+                if self.record:
+                    self.record()
+            if command == "Attitude Hold":
+                if self.hold:
+                    self.hold()
                     
-            # Turn devices in COMMANDS list for given command on
+            # Combined maneuvers are one table lookup
             if command in COMMANDS:
-                for device in COMMANDS[command]:
-                    device.on()
+                self.set_pilot_command(command, 1)
         else:
-            if self.commandInput:
-                self.commandInput(command, 0) # Revert highlight
+            self.notify(command, 0) # Revert highlight
                 
-            # Turn devices in COMMANDS list for given command off
+            # Close only the valves no other active command still needs
             if command in COMMANDS:
-                for device in COMMANDS[command]:
-                    device.off()
+                self.set_pilot_command(command, 0)
     
+    def set_pilot_command(self, command, state):
+        # Valves are written once per report in apply_report
+        if state:
+            self.pilotCommands.add(command)
+        else:
+            self.pilotCommands.discard(command)
+        self.pilotChanged = True
+
+    def notify(self, command, state):
+        self.pendingHighlights[command] = state
+
+    def read_stick_input(self, code, value):
+        # Each stick axis drives its own command pair, so diagonals combine
+        negative, positive = STICK_AXES[code]
+        deflection = value / 32768.0
+        if deflection < -DEADZONE:
+            current = negative
+        elif deflection > DEADZONE:
+            current = positive
+        else:
+            current = None
+
+        for command in (negative, positive):
+            state = 1 if command == current else 0
+            if state != (command in self.pilotCommands):
+                self.notify(command, state)
+                self.set_pilot_command(command, state)
+
+    def read_proportional_input(self, code, value):
+        negative, positive = STICK_AXES[code]
+        deflection = value / 32768.0
+
+        # Duty ramps from zero at the deadzone edge to full at the end of travel
+        duty = max(0.0, (abs(deflection) - DEADZONE) / (1.0 - DEADZONE))
+        active, idle = (negative, positive) if deflection < 0 else (positive, negative)
+        self.thrust.set_duty(idle, 0.0)
+        self.thrust.set_duty(active, duty)
+
+        for command, state in ((idle, 0), (active, 1 if duty else 0)):
+            if state != (command in self.proportionalCommands):
+                if state:
+                    self.proportionalCommands.add(command)
+                else:
+                    self.proportionalCommands.discard(command)
+                self.notify(command, state)
+
+    def apply_report(self):
+        # One allocation decision, one valve diff and net GUI changes per hardware report
+        dispatch = self.dispatch
+        for key, value in self.pendingAxes.items():
+            dispatch[key](value)
+        self.appliedEvents += len(self.pendingAxes)
+        self.pendingAxes.clear()
+
+        if self.pilotChanged:
+            self.pilotChanged = False
+            self.valves.set_commands("pilot", self.pilotCommands)
+            self.decisions += 1
+
+        changed = False
+        for command, state in self.pendingHighlights.items():
+            if self.highlighted.get(command, 0) != state:
+                self.highlighted[command] = state
+                if self.commandInput:
+                    self.commandInput(command, state)
+                self.notifications += 1
+                changed = True
+        self.pendingHighlights.clear()
+        if changed and self.bus:
+            self.bus.publish("cmd.active", frozenset(command for command, state in self.highlighted.items() if state))
+        self.reports += 1
+
+    def resync(self):
+        # Events were lost, rebuild button, trigger and stick state from the device instead of the partial report
+        keys = set(self.controller.active_keys())
+        for (eventType, code), command in self.buttonMap.items():
+            if eventType == evdev.ecodes.EV_KEY:
+                state = 1 if code in keys else 0
+            else:
+                state = 1 if self.controller.absinfo(code).value > 0 else 0
+            # Only maneuvers follow the device, a missed press never fires an action
+            if command in COMMANDS and state != (command in self.pilotCommands):
+                self.set_pilot_command(command, state)
+            self.notify(command, state)
+        for code in STICK_AXES:
+            self.pendingAxes[(evdev.ecodes.EV_ABS, code)] = self.controller.absinfo(code).value
+        self.resyncs += 1
+
     def controller_loop(self):
         for event in self.controller.read_loop():
-            # Handle Button Inputs
-            if event.code == evdev.ecodes.BTN_SELECT:
-                self.read_button_input(event.value, "Capture Image")
-            if event.code == evdev.ecodes.BTN_START:
-                self.read_button_input(event.value, "Quit")
-            if event.code == evdev.ecodes.BTN_TL:
-                self.read_button_input(event.value, "Roll Left")
-            if event.code == evdev.ecodes.BTN_TR:
-                self.read_button_input(event.value, "Roll Right")
-            if event.code == evdev.ecodes.BTN_A:
-                self.read_button_input(event.value, "Ascend")      
-            if event.code == evdev.ecodes.BTN_B:
-                self.read_button_input(event.value, "Descend")      
-            if event.code == evdev.ecodes.BTN_X:
-                self.read_button_input(event.value, "Zero Gyro")               
-            if event.code == evdev.ecodes.BTN_Y:
-                self.read_button_input(event.value, "Reset Gyro")   
-            
-             # Handle Trigger Inputs - Triggers can be read like buttons
-            if event.code == evdev.ecodes.ABS_Z: # Left
-                self.read_button_input(event.value, "Pitch Up")            
-            if event.code == evdev.ecodes.ABS_RZ: # Right
-                self.read_button_input(event.value, "Pitch Down")    
-                        
-            # Handle Joystick Inputs
-            if event.type == evdev.ecodes.EV_ABS:
-                if event.code in (evdev.ecodes.ABS_X, evdev.ecodes.ABS_Y): # Left Joystick         
-                    currentLCommand = None
-                    xLVal = 0
-                    yLVal = 0
-                    
-                    if event.code == evdev.ecodes.ABS_X:
-                        xLVal = event.value / 32768.0
-                    elif event.code == evdev.ecodes.ABS_Y:
-                        yLVal = event.value / 32768.0
-                    
-                    # Determine deadzone threshold to avoid small movements
-                    if abs(xLVal) > DEADZONE or abs(yLVal) > DEADZONE:
-                        if xLVal < -DEADZONE:
-                            currentLCommand = "Left Translation"
-                        elif xLVal > DEADZONE:
-                            currentLCommand = "Right Translation"                        
-                        if yLVal < -DEADZONE:
-                            currentLCommand = "Forward Translation"
-                        elif yLVal > DEADZONE:
-                            currentLCommand = "Backwards Translation"
-                            
-                    if currentLCommand != self.activeLCommand:
-                        if self.activeLCommand:
-                            self.commandInput(self.activeLCommand, 0)
-                            for device in COMMANDS[self.activeLCommand]:
-                                device.off()
-                        if currentLCommand:
-                            self.commandInput(currentLCommand, 1)
-                            for device in COMMANDS[currentLCommand]:
-                                device.on()
-                        self.activeLCommand = currentLCommand
-                    
-                if event.code in (evdev.ecodes.ABS_RX, evdev.ecodes.ABS_RY): # Right Joystick
-                    currentRCommand = None
-                    xRVal = 0
-                    yRVal = 0
-                    
-                    if event.code == evdev.ecodes.ABS_RX:
-                        xRVal = event.value / 32768.0
-                    elif event.code == evdev.ecodes.ABS_RY:
-                        yRVal = event.value / 32768.0
-                    
-                    # Determine deadzone threshold to avoid small movements
-                    if abs(xRVal) > DEADZONE or abs(yRVal) > DEADZONE:
-                        if xRVal < -DEADZONE:
-                            currentRCommand = "Left Yaw"
-                        elif xRVal > DEADZONE:
-                            currentRCommand = "Right Yaw"                        
-                        if yRVal < -DEADZONE:
-                            currentRCommand = None
-                        elif yRVal > DEADZONE:
-                            currentRCommand = None
-                                
-                    if currentRCommand != self.activeRCommand:
-                        if self.activeRCommand:
-                            self.commandInput(self.activeRCommand, 0)
-                            for device in COMMANDS[self.activeRCommand]:
-                                device.off()
-                        if currentRCommand:
-                            self.commandInput(currentRCommand, 1)
-                            for device in COMMANDS[currentRCommand]:
-                                device.on()
-                        self.activeRCommand = currentRCommand      
+            self.handle_event(event)
+
+    def handle_event(self, event):
+        if event.type == evdev.ecodes.EV_SYN:
+            if event.code == evdev.ecodes.SYN_DROPPED:
+                # The pending frame may be missing a release, drop it
+                self.pendingAxes.clear()
+                self.pendingHighlights.clear()
+                self.dropping = True
+            elif event.code == evdev.ecodes.SYN_REPORT:
+                if self.dropping:
+                    self.dropping = False
+                    self.resync()
+                self.apply_report()
+            return
+        if self.dropping:
+            return
+        if event.type not in HANDLED_TYPES:
+            return
+        key = (event.type, event.code)
+        handler = self.dispatch.get(key)
+        if not handler:
+            return
+        self.rawEvents += 1
+        if event.type == evdev.ecodes.EV_ABS:
+            # A later value in the same report replaces this one
+            self.pendingAxes[key] = event.value
+        else:
+            # Every key edge is kept, presses can't be coalesced away
+            handler(event.value)
+            self.appliedEvents += 1
+
+    def stats(self):
+        return {
+            "rawEvents": self.rawEvents,
+            "appliedEvents": self.appliedEvents,
+            "reports": self.reports,
+            "decisions": self.decisions,
+            "notifications": self.notifications,
+            "resyncs": self.resyncs,
+        }
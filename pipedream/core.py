@@ -0,0 +1,148 @@
+import asyncio
+import concurrent.futures
+import time
+import tkinter as tk
+
+class DeviceCore:
+    def __init__(self, root=None, tkRate=100, monitorInterval=0.05, shutdownTimeout=2.0):
+        self.root = root
+        self.tkInterval = 1.0 / tkRate
+        self.monitorInterval = monitorInterval
+        self.shutdownTimeout = shutdownTimeout # Longest a clean exit may take (s)
+        self.coroutines = []
+        self.tasks = []
+        self.loop = None
+        self.stopping = None
+
+        # Camera: executor doing its blocking grabs, and the grab in flight
+        self.executors = {}
+        self.reads = {}
+
+        # Statistics
+        self.loopLag = 0.0 # Smoothed scheduling delay of the event loop (s)
+        self.maxLoopLag = 0.0
+        self.tkPumps = 0
+        self.tkTime = 0.0 # Smoothed time spent in one Tk update (s)
+        self.shutdownTime = 0.0
+
+    def add_controller(self, controller):
+        self.coroutines.append(self.run_controller(controller))
+
+    def add_gyroscope(self, gyro):
+        self.coroutines.append(self.run_gyroscope(gyro))
+
+    def add_camera(self, camera):
+        self.coroutines.append(self.run_camera(camera))
+
+    async def run_controller(self, controller):
+        # evdev wakes the loop for each event, cancelling ends the read cleanly
+        async for event in controller.controller.async_read_loop():
+            controller.handle_event(event)
+
+    async def run_gyroscope(self, gyro):
+        # Serial data is drained from the loop whenever the port's fd is readable
+        fd = gyro.serial.fileno()
+        failed = self.loop.create_future()
+
+        def read():
+            try:
+                gyro.read_available()
+            except Exception as error:
+                # asyncio only logs reader errors and keeps calling while the fd is readable, fail the task instead
+                self.loop.remove_reader(fd)
+                if not failed.done():
+                    failed.set_exception(error)
+
+        self.loop.add_reader(fd, read)
+        try:
+            await failed
+        finally:
+            self.loop.remove_reader(fd)
+
+    async def run_camera(self, camera):
+        # Grabs block in the driver, so each camera gets one executor thread
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="CameraGrab")
+        self.executors[camera] = executor
+        camera.running = True
+        try:
+            while True:
+                read = executor.submit(camera.read_frame)
+                self.reads[camera] = read
+                ret, frame, timestamp = await asyncio.wrap_future(read)
+                if not ret:
+                    await asyncio.sleep(0.01)
+                    continue
+                camera.publish_frame(frame, timestamp)
+        finally:
+            camera.running = False
+            executor.shutdown(wait=False)
+
+    async def pump_tk(self):
+        # Single pump, Tk events and after() callbacks run between device callbacks
+        while True:
+            start = time.perf_counter()
+            try:
+                self.root.update()
+            except tk.TclError:
+                # Window destroyed
+                self.stop()
+                return
+            elapsed = time.perf_counter() - start
+            self.tkTime = 0.9 * self.tkTime + 0.1 * elapsed if self.tkPumps else elapsed
+            self.tkPumps += 1
+            await asyncio.sleep(self.tkInterval)
+
+    async def monitor(self):
+        # How late the loop wakes a sleeping task, one number for every device callback
+        while True:
+            start = self.loop.time()
+            await asyncio.sleep(self.monitorInterval)
+            lag = max(0.0, self.loop.time() - start - self.monitorInterval)
+            self.loopLag = 0.9 * self.loopLag + 0.1 * lag
+            self.maxLoopLag = max(self.maxLoopLag, lag)
+
+    async def main(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        coroutines = self.coroutines + [self.monitor()]
+        if self.root is not None:
+            coroutines.append(self.pump_tk())
+        self.tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+        self.coroutines = []
+
+        # Any device task failing also brings the core down
+        stopper = asyncio.ensure_future(self.stopping.wait())
+        done, _ = await asyncio.wait(self.tasks + [stopper], return_when=asyncio.FIRST_COMPLETED)
+        start = time.monotonic()
+        stopper.cancel()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.wait(self.tasks, timeout=self.shutdownTimeout)
+
+        # Grabs can't be interrupted, wait out the ones in flight before the cameras are released
+        remaining = max(0.0, self.shutdownTimeout - (time.monotonic() - start))
+        concurrent.futures.wait(list(self.reads.values()), timeout=remaining)
+        self.shutdownTime = time.monotonic() - start
+
+        for task in done:
+            if task is not stopper and not task.cancelled() and task.exception():
+                raise task.exception()
+
+    def run(self):
+        # Blocks until stop() is called or the Tk window is destroyed
+        asyncio.run(self.main())
+
+    def stop(self):
+        # Safe from the loop or from any other thread
+        if self.loop and self.stopping:
+            self.loop.call_soon_threadsafe(self.stopping.set)
+
+    def stats(self):
+        return {
+            "tasks": len(self.tasks),
+            "loopLag": self.loopLag,
+            "maxLoopLag": self.maxLoopLag,
+            "tkPumps": self.tkPumps,
+            "tkTime": self.tkTime,
+            "shutdownTime": self.shutdownTime,
+        }
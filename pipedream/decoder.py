@@ -0,0 +1,77 @@
+import struct
+import time
+import numpy as np
+from .framer import HEADER, PACKET_SIZE
+
+# Raw WitMotion packet: header, type, four signed shorts, checksum
+FRAME_DTYPE = np.dtype([
+    ("header", "u1"),
+    ("type", "u1"),
+    ("data", "<i2", (4,)),
+    ("checksum", "u1"),
+])
+
+class PacketDecoder:
+    def __init__(self, name, fmt, scales):
+        self.name = name
+        self.struct = struct.Struct(fmt)
+        self.scales = scales
+        self.size = len(scales)
+
+    def decode(self, buffer, offset=0):
+        # Payload starts after the header and type bytes
+        return list(map(float.__mul__, self.scales, self.struct.unpack_from(buffer, offset + 2)))
+
+# Data Type: decoder, built once at import
+DECODERS = {
+    0x50: PacketDecoder("Time", "<BBBBBBH", (1.0,) * 7),               # YY MM DD hh mm ss ms
+    0x51: PacketDecoder("Acceleration", "<hhh", (16.0 * 9.8 / 32768.0,) * 3),
+    0x52: PacketDecoder("Angular Velocity", "<hhh", (2000.0 / 32768.0,) * 3),
+    0x53: PacketDecoder("Angle", "<hhh", (180.0 / 32768.0,) * 3),
+    0x54: PacketDecoder("Magnetometer", "<hhh", (1.0,) * 3),
+    0x56: PacketDecoder("Pressure", "<ii", (1.0, 0.01)),               # Pa, m
+    0x59: PacketDecoder("Quaternion", "<hhhh", (1.0 / 32768.0,) * 4),  # q0 q1 q2 q3
+}
+
+# Data Type: scale for packets with an x/y/z layout, these can be batch decoded
+SCALES = {dtype: decoder.scales[0] for dtype, decoder in DECODERS.items() if decoder.struct.format == "<hhh"}
+
+# Lookup tables indexed by type byte, zero marks types without an x/y/z layout
+SCALE_TABLE = np.zeros(256)
+for dtype, scale in SCALES.items():
+    SCALE_TABLE[dtype] = scale
+SCALAR_TABLE = np.zeros(256, dtype=bool)
+for dtype in DECODERS:
+    SCALAR_TABLE[dtype] = dtype not in SCALES
+
+# Columns of a decoded batch
+TIMESTAMP, DTYPE, X, Y, Z = range(5)
+
+def frame_view(chunk):
+    count = len(chunk) // PACKET_SIZE
+    return np.frombuffer(chunk, dtype=np.uint8, count=count * PACKET_SIZE).reshape(count, PACKET_SIZE)
+
+def decode_batch(chunk, timestamp=None):
+    # chunk holds aligned packets back to back, e.g. PacketFramer.aligned() or a recorded log
+    raw = frame_view(chunk)
+    frames = raw.view(FRAME_DTYPE)[:, 0]
+
+    # Validate every header and checksum at once
+    valid = raw[:, 0] == HEADER
+    valid &= (raw[:, :-1].sum(axis=1, dtype=np.uint16) & 0xFF) == raw[:, -1]
+    scale = SCALE_TABLE[frames["type"]]
+    valid &= scale != 0.0
+
+    frames = frames[valid]
+    samples = np.empty((len(frames), 5))
+    if timestamp is None:
+        timestamp = time.time()
+    samples[:, TIMESTAMP] = timestamp if np.ndim(timestamp) == 0 else np.asarray(timestamp)[valid]
+    samples[:, DTYPE] = frames["type"]
+    np.multiply(frames["data"][:, :3], scale[valid, None], out=samples[:, X:])
+    return samples
+
+def scalar_offsets(chunk):
+    # Offsets of packets that need their own decoder instead of the batch path
+    types = frame_view(chunk)[:, 1]
+    return (np.flatnonzero(SCALAR_TABLE[types]) * PACKET_SIZE).tolist()
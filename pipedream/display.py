@@ -0,0 +1,74 @@
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+class FrameDisplay:
+    def __init__(self, label, size=None):
+        self.label = label
+        self.size = size # (width, height), None to use the frame size
+
+        # Preallocated output, reused for every frame of the same size
+        self.resized = None
+        self.rgba = None
+        self.image = None
+        self.photo = None
+
+    def container_size(self):
+        # Space a fixed size parent gives the image. A parent that shrink-wraps the label would only
+        # report the previous photo's size, so the size could never go down
+        parent = self.label.master
+        if parent.grid_propagate() and parent.pack_propagate():
+            return None
+        if not parent.winfo_ismapped():
+            return None
+        padding = 2 * (int(self.label.cget("borderwidth")) + int(self.label.cget("highlightthickness")))
+        width = parent.winfo_width() - padding - 2 * int(self.label.cget("padx"))
+        height = parent.winfo_height() - padding - 2 * int(self.label.cget("pady"))
+        if width <= 1 or height <= 1:
+            return None
+        return width, height
+
+    def target_size(self, width, height):
+        targetWidth, targetHeight = self.size or (width, height)
+        available = self.container_size()
+        if available:
+            targetWidth = min(targetWidth, available[0])
+            targetHeight = min(targetHeight, available[1])
+
+        # Only ever downscale, keeping the aspect ratio
+        scale = min(targetWidth / width, targetHeight / height, 1.0)
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    def allocate(self, width, height):
+        self.resized = np.empty((height, width, 3), dtype=np.uint8)
+        self.rgba = np.empty((height, width, 4), dtype=np.uint8)
+
+        # PIL image sharing memory with the output buffer, PIL only maps 4 byte pixels
+        self.image = Image.frombuffer("RGBA", (width, height), self.rgba, "raw", "RGBA", 0, 1)
+        self.photo = ImageTk.PhotoImage("RGBA", (width, height))
+        self.label.imgtk = self.photo
+        self.label.config(image=self.photo)
+
+    def convert(self, frame):
+        height, width = frame.shape[:2]
+        targetWidth, targetHeight = self.target_size(width, height)
+        if self.rgba is None or self.rgba.shape[:2] != (targetHeight, targetWidth):
+            self.allocate(targetWidth, targetHeight)
+
+        # Downscale before the color conversion so it runs on fewer pixels
+        if (targetWidth, targetHeight) != (width, height):
+            cv2.resize(frame, (targetWidth, targetHeight), dst=self.resized, interpolation=cv2.INTER_AREA)
+            frame = self.resized
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA, dst=self.rgba)
+        return self.rgba
+
+    def draw_lines(self, lines):
+        for i, line in enumerate(lines):
+            cv2.putText(self.rgba, line, (8, 20 + 18 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0, 255), 1, cv2.LINE_AA)
+
+    def show(self, frame, lines=None):
+        self.convert(frame)
+        if lines:
+            # Drawn on the output buffer, the captured frame stays clean
+            self.draw_lines(lines)
+        self.photo.paste(self.image)
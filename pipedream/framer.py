@@ -0,0 +1,120 @@
+HEADER = 0x55
+PACKET_SIZE = 11
+
+class PacketFramer:
+    def __init__(self, capacity=8192, packetSize=PACKET_SIZE, header=HEADER):
+        self.capacity = capacity
+        self.packetSize = packetSize
+        self.header = header
+        self.headerByte = bytes([header])
+
+        # Fixed storage, frames are handed out as views into it
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+        # Statistics
+        self.frameCount = 0
+        self.droppedBytes = 0
+        self.checksumErrors = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def compact(self):
+        # Move the unparsed tail (normally less than one packet) to the front
+        remaining = self.end - self.start
+        if self.start and remaining:
+            self.buffer[:remaining] = self.view[self.start:self.end]
+        self.start = 0
+        self.end = remaining
+
+    def feed(self, data):
+        size = len(data)
+        if size > self.capacity - self.end:
+            self.compact()
+            overflow = size - (self.capacity - self.end)
+            if overflow > 0:
+                # Buffer overrun, keep the newest bytes
+                discard = min(overflow, self.end)
+                self.droppedBytes += overflow
+                self.start += discard
+                self.compact()
+                if size > self.capacity:
+                    data = memoryview(data)[size - self.capacity:]
+                    size = self.capacity
+        self.buffer[self.end:self.end + size] = data
+        self.end += size
+
+    def frames(self):
+        buffer = self.buffer
+        view = self.view
+        size = self.packetSize
+        header = self.header
+        start = self.start
+
+        while self.end - start >= size:
+            if buffer[start] != header:
+                # Skip to the next header with a single bulk search
+                index = buffer.find(self.headerByte, start, self.end)
+                if index < 0:
+                    index = self.end
+                self.droppedBytes += index - start
+                start = index
+                continue
+
+            checksum = start + size - 1
+            if (sum(buffer[start:checksum]) & 0xFF) != buffer[checksum]:
+                # Header was payload data or the packet is corrupt, resync past it
+                self.checksumErrors += 1
+                self.droppedBytes += 1
+                start += 1
+                continue
+
+            self.start = start + size
+            self.frameCount += 1
+            yield view[start:start + size]
+            start = self.start
+
+        self.start = start
+        if self.start == self.end:
+            self.start = self.end = 0
+
+    def aligned(self):
+        # Longest run of consecutive header-aligned packets as one contiguous view
+        buffer = self.buffer
+        size = self.packetSize
+
+        while self.end - self.start >= size:
+            start = self.start
+            if buffer[start] != self.header:
+                index = buffer.find(self.headerByte, start, self.end)
+                if index < 0:
+                    index = self.end
+                self.droppedBytes += index - start
+                self.start = index
+                continue
+
+            checksum = start + size - 1
+            if (sum(buffer[start:checksum]) & 0xFF) != buffer[checksum]:
+                # Only the first packet is checked here to confirm alignment
+                self.checksumErrors += 1
+                self.droppedBytes += 1
+                self.start += 1
+                continue
+
+            count = (self.end - start) // size
+            headers = buffer[start:start + count * size:size]
+            count -= len(headers.lstrip(self.headerByte))
+
+            self.start = start + count * size
+            self.frameCount += count
+            return self.view[start:self.start]
+
+        if self.start == self.end:
+            self.start = self.end = 0
+        return self.view[0:0]
+
+    def reset(self):
+        self.start = self.end = 0
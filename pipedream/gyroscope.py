@@ -1,86 +1,324 @@
+import select
 import serial
 import threading
-import struct
+import time
+import numpy as np
+from .attitude import ATTITUDE_TYPE, wrap_angle
+from .decoder import DECODERS, SCALES, DTYPE, X, Y, Z, decode_batch, scalar_offsets
+from .framer import HEADER, PACKET_SIZE, PacketFramer
+
+# WitMotion configuration commands: 0xFF 0xAA register dataL dataH
+UNLOCK = bytes([0xFF, 0xAA, 0x69, 0x88, 0xB5])
+SAVE = bytes([0xFF, 0xAA, 0x00, 0x00, 0x00])
+RATE_REGISTER = 0x03
+BAUD_REGISTER = 0x04
+COMMAND_DELAY = 0.1
+
+# Data type: bus topic for the latest reading of each chunk
+TOPICS = {
+    0x51: "imu.accel",
+    0x52: "imu.gyro",
+    0x53: "imu.angle",
+}
+
+# Sensor angles, zeroed per component and wrapped back into [-180, 180)
+ANGLE_TYPE = 0x53
+
+# Baud rate: register value
+BAUD_CODES = {
+    4800: 0x01,
+    9600: 0x02,
+    19200: 0x03,
+    38400: 0x04,
+    57600: 0x05,
+    115200: 0x06,
+    230400: 0x07,
+    460800: 0x08,
+    921600: 0x09,
+}
+
+# Output rate (Hz): register value
+RATE_CODES = {
+    0.2: 0x01,
+    0.5: 0x02,
+    1: 0x03,
+    2: 0x04,
+    5: 0x05,
+    10: 0x06,
+    20: 0x07,
+    50: 0x08,
+    100: 0x09,
+    125: 0x0A,
+    200: 0x0B,
+}
+
+# Chunks with fewer packets are decoded with the struct decoders, NumPy's per call overhead dominates below this
+BATCH_PACKETS = 30
+
+# Order to try when detecting the baud rate, factory default first
+AUTO_BAUDS = (9600, 115200, 230400, 921600, 460800, 57600, 38400, 19200, 4800)
 
 class GyroscopeHandler:
-    def __init__(self, port='/dev/ttyUSB0', baud=9600, dataCallback=None):
-        self.serial = serial.Serial(port, baud, timeout=100)
+    def __init__(self, port='/dev/ttyUSB0', baud=None, dataCallback=None, batchCallback=None, rate=None, targetBaud=None, attitudeFilter=None, bus=None):
+        # Non-blocking port, packets are dispatched as soon as they arrive
+        self.serial = serial.Serial(port, baud or 9600, timeout=0)
         self.dataCallback = dataCallback
-        self.buffer = bytearray()
+        self.batchCallback = batchCallback
+        self.attitudeFilter = attitudeFilter
+        self.bus = bus # TelemetryBus, consumers run on their own threads
+        self.framer = PacketFramer()
         self.running = True
+        self.thread = None
+
+        if baud is None:
+            self.detect_baud()
+        if targetBaud:
+            self.set_baud(targetBaud)
+        if rate:
+            self.set_rate(rate)
          
-        self.values = {
-            0x51: [0.0,0.0,0.0],
-            0x52: [0.0,0.0,0.0],
-            0x53: [0.0,0.0,0.0],
-        }
-        self.zeroValues = {
-            0x51: [0.0,0.0,0.0],
-            0x52: [0.0,0.0,0.0],
-            0x53: [0.0,0.0,0.0],
-        }
+        self.values = {dtype: [0.0] * decoder.size for dtype, decoder in DECODERS.items()}
+        self.zeroValues = {dtype: [0.0,0.0,0.0] for dtype in SCALES}
+        self.zeroTable = np.zeros((256, 3)) # Offsets indexed by type byte
         
     def start(self):
-        thread = threading.Thread(target=self.read_serial_loop, daemon=True)
-        thread.start()
+        self.thread = threading.Thread(target=self.read_serial_loop, daemon=True)
+        self.thread.start()
+
+    def send_command(self, register, value):
+        self.serial.write(UNLOCK)
+        time.sleep(COMMAND_DELAY)
+        self.write_register(register, value)
+        self.serial.write(SAVE)
+        time.sleep(COMMAND_DELAY)
+
+    def write_register(self, register, value):
+        self.serial.write(bytes([0xFF, 0xAA, register, value & 0xFF, (value >> 8) & 0xFF]))
+        self.serial.flush() # Out of the UART before anything else changes
+        time.sleep(COMMAND_DELAY)
+
+    def set_rate(self, rate):
+        if rate not in RATE_CODES:
+            raise ValueError(f"Unsupported output rate {rate} Hz, expected one of {sorted(RATE_CODES)}")
+        self.send_command(RATE_REGISTER, RATE_CODES[rate])
+
+    def set_baud(self, baud):
+        if baud not in BAUD_CODES:
+            raise ValueError(f"Unsupported baud rate {baud}, expected one of {sorted(BAUD_CODES)}")
+        if baud == self.serial.baudrate:
+            return
+        self.serial.write(UNLOCK)
+        time.sleep(COMMAND_DELAY)
+        self.write_register(BAUD_REGISTER, BAUD_CODES[baud])
+
+        # The sensor switches right after the register write, follow it before saving
+        self.serial.baudrate = baud
+        self.serial.reset_input_buffer()
+        self.framer.reset()
+        self.serial.write(UNLOCK)
+        time.sleep(COMMAND_DELAY)
+        self.serial.write(SAVE)
+        self.serial.flush()
+        time.sleep(COMMAND_DELAY)
+
+        # Packets at the new rate confirm the switch
+        try:
+            self.detect_baud(candidates=(baud,))
+        except Exception:
+            raise Exception(f"Gyroscope did not switch to {baud} baud")
+
+    def detect_baud(self, candidates=AUTO_BAUDS, window=0.5):
+        for baud in candidates:
+            self.serial.baudrate = baud
+            self.serial.reset_input_buffer()
+            framer = PacketFramer()
+
+            # A couple of packets with valid checksums confirms the rate
+            deadline = time.monotonic() + window
+            while time.monotonic() < deadline:
+                # The deadline can pass after the while check, select rejects a negative timeout
+                select.select([self.serial.fileno()], [], [], max(0.0, deadline - time.monotonic()))
+                framer.feed(self.serial.read(self.serial.in_waiting))
+                for _ in framer.frames():
+                    pass
+                if framer.frameCount >= 2:
+                    self.framer.reset()
+                    return baud
+        raise Exception("Gyroscope not found")
 
     def convert_hex(self, packet):
         if len(packet) != 11 or packet[0] != 0x55:
             return None
 
         dtype = packet[1]
-        payload = packet[2:10]
         checksum = packet[10]
         if (sum(packet[:10]) & 0xFF) != checksum:
             return None  # Checksum mismatch
 
-        # Convert payload to signed shorts
-        vals = struct.unpack('<hhh', payload[0:6])
-        scale = {
-            0x51: 16.0 * 9.8 / 32768.0,  # Acceleration
-            0x52: 2000.0 / 32768.0,      # Angular velocity
-            0x53: 180.0 / 32768.0        # Angle
-        }
-
-        if dtype in scale:
-            return dtype, [v * scale[dtype] for v in vals]
+        decoder = DECODERS.get(dtype)
+        if decoder:
+            return dtype, decoder.decode(packet)
         else:
             return None  # Unknown data type
     
     def zero(self, state):
         if state == 1:
-            self.zeroValues = {k: list(v) for k, v in self.values.items()}
+            self.zeroValues = {k: list(self.values[k]) for k in SCALES}
         elif state == 0:
-            self.zeroValues = {
-                0x51: [0.0,0.0,0.0],
-                0x52: [0.0,0.0,0.0],
-                0x53: [0.0,0.0,0.0],
-            }
+            self.zeroValues = {k: [0.0,0.0,0.0] for k in SCALES}
+        if self.attitudeFilter:
+            # Quaternion tare, no wrap around at +-180 deg yaw
+            if state == 1:
+                self.attitudeFilter.tare()
+            elif state == 0:
+                self.attitudeFilter.clear_tare()
+        for dtype, offsets in self.zeroValues.items():
+            self.zeroTable[dtype] = offsets
         return
 
+    def attitude(self):
+        # Latest zeroed angles in degrees, fused when a filter is attached
+        if self.attitudeFilter:
+            return self.attitudeFilter.angles()
+        return [wrap_angle(value - offset) for value, offset in zip(self.values[0x53], self.zeroValues[0x53])]
+
+    def process_chunk(self, chunk, timestamp=None):
+        if len(chunk) < BATCH_PACKETS * PACKET_SIZE:
+            self.process_packets(chunk, timestamp)
+            return
+
+        # Packets without an x/y/z layout (time, pressure, quaternion)
+        for offset in scalar_offsets(chunk):
+            parsed = self.convert_hex(chunk[offset:offset + 11])
+            if parsed:
+                dtype, value = parsed
+                self.values[dtype] = value
+                if self.dataCallback:
+                    self.dataCallback(dtype, value)
+
+        samples = decode_batch(chunk, timestamp)
+        if not len(samples):
+            return
+        dtypes = samples[:, DTYPE].astype(np.intp)
+
+        # Latest raw reading of each type, kept for zeroing
+        for dtype in SCALES:
+            index = np.flatnonzero(dtypes == dtype)
+            if len(index):
+                self.values[dtype] = samples[index[-1], X:].tolist()
+
+        # Filter sees raw readings, it is tared separately
+        if self.attitudeFilter:
+            self.attitudeFilter.update_batch(samples)
+            self.publish_attitude()
+
+        samples[:, X:] -= self.zeroTable[dtypes]
+        angles = dtypes == ANGLE_TYPE
+        if angles.any():
+            samples[angles, X:] = wrap_angle(samples[angles, X:])
+
+        if self.batchCallback:
+            self.batchCallback(samples)
+        if self.bus:
+            latest = {}
+            for dtype in TOPICS:
+                index = np.flatnonzero(dtypes == dtype)
+                if len(index):
+                    latest[dtype] = samples[index[-1], X:].tolist()
+            self.publish(samples, latest)
+        if self.dataCallback:
+            # Per packet compatibility layer
+            for _, dtype, x, y, z in samples.tolist():
+                self.dataCallback(int(dtype), [x, y, z])  # Trigger callback to gui
+
+    def process_packets(self, chunk, timestamp=None):
+        # Same results as the batch path for the few packets of a live read
+        if timestamp is None:
+            timestamp = time.time()
+        chunk = bytes(chunk) # A few hundred bytes at most, slicing bytes is much cheaper than a memoryview
+        rows = []
+        values = self.values
+        for offset in range(0, len(chunk) - PACKET_SIZE + 1, PACKET_SIZE):
+            if chunk[offset] != HEADER or (sum(chunk[offset:offset + 10]) & 0xFF) != chunk[offset + 10]:
+                continue
+            dtype = chunk[offset + 1]
+            decoder = DECODERS.get(dtype)
+            if not decoder:
+                continue
+            value = values[dtype] = decoder.decode(chunk, offset)
+            if dtype in SCALES:
+                rows.append([timestamp, dtype] + value)
+            elif self.dataCallback:
+                self.dataCallback(dtype, value)
+        if not rows:
+            return
+
+        if self.attitudeFilter:
+            self.attitudeFilter.update_rows(rows)
+            self.publish_attitude()
+
+        zeroValues = self.zeroValues
+        for row in rows:
+            x, y, z = zeroValues[row[DTYPE]]
+            row[X] -= x
+            row[Y] -= y
+            row[Z] -= z
+            if row[DTYPE] == ANGLE_TYPE:
+                row[X:] = [wrap_angle(value) for value in row[X:]]
+
+        if self.batchCallback or self.bus:
+            samples = np.array(rows)
+            if self.batchCallback:
+                self.batchCallback(samples)
+            if self.bus:
+                self.publish(samples, {row[DTYPE]: row[X:] for row in rows if row[DTYPE] in TOPICS})
+        if self.dataCallback:
+            for row in rows:
+                self.dataCallback(row[DTYPE], row[X:])  # Trigger callback to gui
+
+    def publish_attitude(self):
+        angles = self.attitudeFilter.angles()
+        if self.dataCallback:
+            self.dataCallback(ATTITUDE_TYPE, angles)
+        if self.bus:
+            self.bus.publish("imu.attitude", angles)
+
+    def publish(self, samples, latest):
+        # Whole batch for loggers, latest reading of each type for displays
+        self.bus.publish("imu.samples", samples)
+        for dtype, value in latest.items():
+            self.bus.publish(TOPICS[dtype], value)
+
+    def read_available(self):
+        # Drain whatever the driver has buffered
+        waiting = self.serial.in_waiting
+        if not waiting:
+            return
+        framer = self.framer
+        data = self.serial.read(min(waiting, framer.capacity - PACKET_SIZE))
+        timestamp = time.time()
+        framer.feed(data)
+
+        # More than one chunk only when a corrupt packet splits the read
+        chunk = framer.aligned()
+        while chunk:
+            self.process_chunk(chunk, timestamp)
+            chunk = framer.aligned() if len(framer) >= PACKET_SIZE else None
+
     def read_serial_loop(self):
+        fd = self.serial.fileno()
         while self.running:
-            data = self.serial.read(33) # 1 packet = 33 bytes
-            self.buffer.extend(data)
-
-            while len(self.buffer) >= 11:
-                if self.buffer[0] == 0x55:
-                    packet = self.buffer[:11]
-                    parsed = self.convert_hex(packet)
-        
-                    if parsed:
-                        dtype, value = parsed
-                        self.values[dtype] = value
-                        
-                        adjustedValues = [v - z for v,z in zip(self.values[dtype], self.zeroValues[dtype])]
-                    
-                        if self.dataCallback:
-                            self.dataCallback(dtype, adjustedValues)  # Trigger callback to gui
-                        
-                    self.buffer = self.buffer[11:]
-                else:
-                    self.buffer.pop(0) # Misaligned, drop byte
+            try:
+                ready, _, _ = select.select([fd], [], [], 0.1)
+                if ready:
+                    self.read_available()
+            except (OSError, ValueError, serial.SerialException):
+                if self.running:
+                    raise
+                break
     
     def stop(self):
         self.running = False
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1.0)
         self.serial.close()
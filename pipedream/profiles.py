@@ -0,0 +1,92 @@
+import sys
+import time
+import cv2
+
+# Profile: capture settings negotiated with the V4L2 driver
+PROFILES = {
+    "low-latency": {"fourcc": "MJPG", "width": 640, "height": 480, "fps": 30, "buffersize": 1},
+    "fast": {"fourcc": "MJPG", "width": 320, "height": 240, "fps": 60, "buffersize": 1},
+    "hd": {"fourcc": "MJPG", "width": 1280, "height": 720, "fps": 30, "buffersize": 1},
+    "yuyv": {"fourcc": "YUYV", "width": 640, "height": 480, "fps": 30, "buffersize": 1},
+}
+
+def decode_fourcc(value):
+    value = int(value)
+    return "".join(chr((value >> 8 * i) & 0xFF) for i in range(4))
+
+def open_capture(cameraIndex=0, profile=None):
+    # Capture objects (e.g. a simulated camera) are used as they are
+    if hasattr(cameraIndex, "read"):
+        cap = cameraIndex
+    # V4L2 directly for device indexes, so the FOURCC and buffer size are honoured
+    elif profile and isinstance(cameraIndex, int) and sys.platform.startswith("linux"):
+        cap = cv2.VideoCapture(cameraIndex, cv2.CAP_V4L2)
+    else:
+        cap = cv2.VideoCapture(cameraIndex)
+    mismatches = {}
+    if profile and cap.isOpened():
+        mismatches = apply_profile(cap, profile)
+    return cap, mismatches
+
+def apply_profile(cap, profile):
+    settings = PROFILES[profile]
+
+    # FOURCC has to be set before the resolution for most UVC cameras
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*settings["fourcc"]))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, settings["width"])
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, settings["height"])
+    cap.set(cv2.CAP_PROP_FPS, settings["fps"])
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, settings["buffersize"])
+    return verify_profile(cap, profile)
+
+def verify_profile(cap, profile):
+    # Setting: (requested, actual) for everything the driver did not accept
+    settings = PROFILES[profile]
+    actual = {
+        "fourcc": decode_fourcc(cap.get(cv2.CAP_PROP_FOURCC)),
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fps": cap.get(cv2.CAP_PROP_FPS),
+        "buffersize": int(cap.get(cv2.CAP_PROP_BUFFERSIZE)),
+    }
+    mismatches = {}
+    for name, requested in settings.items():
+        if name == "fps":
+            matched = abs(actual[name] - requested) < 0.5
+        else:
+            matched = actual[name] == requested
+        if not matched:
+            mismatches[name] = (requested, actual[name])
+    return mismatches
+
+def probe_profiles(cameraIndex=0, profiles=None, frames=90, warmup=10):
+    results = []
+    for profile in profiles or PROFILES:
+        cap, mismatches = open_capture(cameraIndex, profile)
+        if not cap.isOpened():
+            raise Exception("Camera not found")
+        try:
+            # Let exposure and the driver queue settle first
+            for _ in range(warmup):
+                cap.read()
+
+            readTimes = []
+            start = time.perf_counter()
+            for _ in range(frames):
+                readStart = time.perf_counter()
+                ret, _ = cap.read()
+                if not ret:
+                    break
+                readTimes.append(time.perf_counter() - readStart)
+            elapsed = time.perf_counter() - start
+        finally:
+            cap.release()
+
+        results.append({
+            "profile": profile,
+            "fps": len(readTimes) / elapsed if elapsed else 0.0,
+            "meanRead": sum(readTimes) / len(readTimes) if readTimes else 0.0,
+            "maxRead": max(readTimes, default=0.0),
+            "mismatches": mismatches,
+        })
+    return results
@@ -0,0 +1,193 @@
+import multiprocessing
+import time
+import cv2
+import numpy as np
+from multiprocessing import shared_memory
+from .camera import CameraFeed
+from .profiles import PROFILES, open_capture
+
+# Header fields, stored as float64 at the start of the shared block
+LATEST, HEARTBEAT, FPS, READY, CPU = range(5)
+HEADER_FIELDS = 5
+
+def ring_size(shape, slots):
+    return 8 * (HEADER_FIELDS + 2 * slots) + slots * int(np.prod(shape))
+
+def map_ring(buffer, shape, slots):
+    # header, per slot sequence numbers, per slot timestamps, frames
+    header = np.ndarray((HEADER_FIELDS,), dtype=np.float64, buffer=buffer)
+    offset = 8 * HEADER_FIELDS
+    sequences = np.ndarray((slots,), dtype=np.int64, buffer=buffer, offset=offset)
+    offset += 8 * slots
+    timestamps = np.ndarray((slots,), dtype=np.float64, buffer=buffer, offset=offset)
+    offset += 8 * slots
+    frames = np.ndarray((slots,) + shape, dtype=np.uint8, buffer=buffer, offset=offset)
+    return header, sequences, timestamps, frames
+
+def capture_process(name, cameraIndex, profile, shape, slots, stopEvent):
+    memory = shared_memory.SharedMemory(name=name)
+    header, sequences, timestamps, frames = map_ring(memory.buf, shape, slots)
+    cap, _ = open_capture(cameraIndex, profile)
+    if not cap.isOpened():
+        memory.close()
+        return
+
+    header[FPS] = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    header[READY] = 1.0
+    sequence = int(header[LATEST])
+    height, width = shape[:2]
+    frame = None
+    try:
+        while not stopEvent.is_set():
+            header[HEARTBEAT] = time.monotonic()
+            header[CPU] = time.process_time()
+            slot = (sequence + 1) % slots
+
+            # -1 marks the slot as being written
+            sequences[slot] = -1
+            ret, frame = cap.read(frames[slot])
+            if not ret:
+                time.sleep(0.01)
+                continue
+            if frame.shape != shape:
+                cv2.resize(frame, (width, height), dst=frames[slot])
+            elif not np.shares_memory(frame, frames[slot]):
+                frames[slot] = frame
+
+            sequence += 1
+            timestamps[slot] = time.monotonic()
+            sequences[slot] = sequence
+            header[LATEST] = sequence
+    finally:
+        cap.release()
+        del header, sequences, timestamps, frames, frame
+        memory.close()
+
+class ProcessCameraFeed(CameraFeed):
+    def __init__(self, cameraIndex=0, profile=None, frameShape=None, slots=4, hangTimeout=2.0, startTimeout=10.0, **options):
+        # Frame size is fixed up front so both processes agree on the layout
+        if frameShape is None:
+            settings = PROFILES.get(profile, {"width": 640, "height": 480})
+            frameShape = (settings["height"], settings["width"], 3)
+        self.frameShape = frameShape
+        self.slots = slots
+        self.hangTimeout = hangTimeout # Heartbeat gap that counts as hung, once the camera is open
+        self.startTimeout = startTimeout # Fresh interpreter, numpy and cv2 imports and the camera open, slow on a Pi
+        self.spawnTime = 0.0
+        self.restarts = 0
+        self.lastRestart = 0.0
+        self.tornFrames = 0 # Slots the child rewrote while they were being copied
+        super().__init__(cameraIndex, profile, **options)
+
+    def open(self, cameraIndex, profile):
+        self.cameraIndex = cameraIndex
+        self.profile = profile
+        self.profileMismatches = {}
+
+        self.memory = shared_memory.SharedMemory(create=True, size=ring_size(self.frameShape, self.slots))
+        self.header, self.sequences, self.timestamps, self.frames = map_ring(self.memory.buf, self.frameShape, self.slots)
+        self.header[:] = 0
+        self.sequences[:] = 0
+
+        # Spawned, a fork would inherit locks held by the Tk, gyro and controller threads. The child only
+        # imports the camera modules, never the controller with its GPIO pins
+        self.context = multiprocessing.get_context("spawn")
+        self.process = None
+        self.spawn()
+
+        # Wait for the camera to open in the child
+        deadline = time.monotonic() + self.startTimeout
+        while not self.header[READY]:
+            if not self.process.is_alive() or time.monotonic() > deadline:
+                self.close()
+                raise Exception("Camera not found")
+            time.sleep(0.01)
+        self.fps = float(self.header[FPS])
+        self.lastSequence = int(self.header[LATEST])
+
+    def spawn(self):
+        self.stopEvent = self.context.Event()
+        self.header[READY] = 0.0
+        self.spawnTime = time.monotonic()
+        self.process = self.context.Process(
+            target=capture_process,
+            args=(self.memory.name, self.cameraIndex, self.profile, self.frameShape, self.slots, self.stopEvent),
+            daemon=True,
+        )
+        self.process.start()
+
+    def restart(self):
+        # Crashed or hung child, replace it without touching the GUI
+        self.stop_process()
+        self.restarts += 1
+        self.spawn()
+
+    def stop_process(self):
+        self.stopEvent.set()
+        self.process.join(timeout=1.0)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=1.0)
+        # Reaped, its time is in os.times() now
+        self.header[CPU] = 0.0
+
+    def read_frame(self):
+        # Wait for the child to publish a newer frame
+        deadline = time.monotonic() + 0.1
+        while self.running:
+            sequence = int(self.header[LATEST])
+            if sequence > self.lastSequence:
+                break
+            now = time.monotonic()
+            if self.header[READY]:
+                hung = now - self.header[HEARTBEAT] > self.hangTimeout
+            else:
+                # Still starting, the heartbeat only begins once the camera is open
+                hung = now - self.spawnTime > self.startTimeout
+            if not self.process.is_alive() or hung:
+                # Back off so a missing camera doesn't fork in a tight loop
+                if now - self.lastRestart > self.hangTimeout:
+                    self.lastRestart = now
+                    self.restart()
+            if now > deadline:
+                return False, None, 0.0
+            time.sleep(0.001)
+        else:
+            return False, None, 0.0
+
+        slot = sequence % self.slots
+        timestamp = float(self.timestamps[slot])
+        if self.burstSeconds > 0 and self.ring is None:
+            self.create_ring(self.frames[slot])
+
+        # Consumers never see the shared slot, copy it out then check the child didn't rewrite it meanwhile
+        if self.ring is not None:
+            frame = self.ring.slot()
+            np.copyto(frame, self.frames[slot])
+        else:
+            frame = self.frames[slot].copy()
+        if self.sequences[slot] != sequence:
+            # Overwritten before or while we copied it
+            self.tornFrames += 1
+            return False, None, 0.0
+        self.lastSequence = sequence
+        return True, frame, timestamp
+
+    def child_cpu_time(self):
+        # Capture child's own CPU time, written every frame
+        return super().child_cpu_time() + float(self.header[CPU])
+
+    def stats(self):
+        stats = super().stats()
+        stats["restarts"] = self.restarts
+        stats["tornFrames"] = self.tornFrames
+        return stats
+
+    def close(self):
+        if self.process:
+            self.stop_process()
+
+        # Only these views point into the block, frames handed out are copies. They must go before it closes
+        self.header = self.sequences = self.timestamps = self.frames = None
+        self.memory.close()
+        self.memory.unlink()
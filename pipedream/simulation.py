@@ -0,0 +1,373 @@
+import asyncio
+import math
+import os
+import random
+import struct
+import threading
+import time
+import tty
+import cv2
+import evdev
+import numpy as np
+
+# Device name ControllerHandler.find_controller looks for
+GAMEPAD_NAME = "Logitech Gamepad F310"
+GAMEPAD_RATE = 125 # Hz, USB polling rate of the F310
+
+# Buttons the scripted pilot presses, never Start (Quit) or the camera and gyro actions
+SCRIPT_BUTTONS = (evdev.ecodes.BTN_A, evdev.ecodes.BTN_B, evdev.ecodes.BTN_TL, evdev.ecodes.BTN_TR)
+
+GRAVITY = 9.8
+
+# Data type: full scale the sensor reports, as in decoder.DECODERS
+FULL_SCALE = {
+    0x51: 16.0 * GRAVITY, # m/s^2
+    0x52: 2000.0, # deg/s
+    0x53: 180.0, # deg
+    0x54: 32768.0, # raw counts
+}
+
+# Data type: sensor noise, uniform, in the units above
+NOISE = {
+    0x51: 0.05,
+    0x52: 0.2,
+    0x53: 0.0,
+    0x54: 2.0,
+}
+
+def stick_script(reports, seed=1, pressChance=0.05):
+    # Circular sweeps of both sticks with the odd button press or release, a SYN after every report like a real F310
+    rng = random.Random(seed)
+    events = []
+    for poll in range(reports):
+        angle = poll * 0.02
+        events.append((evdev.ecodes.EV_ABS, evdev.ecodes.ABS_X, int(32767 * math.cos(angle))))
+        events.append((evdev.ecodes.EV_ABS, evdev.ecodes.ABS_Y, int(32767 * math.sin(angle))))
+        events.append((evdev.ecodes.EV_ABS, evdev.ecodes.ABS_RX, int(32767 * math.sin(0.7 * angle))))
+        if rng.random() < pressChance:
+            events.append((evdev.ecodes.EV_KEY, rng.choice(SCRIPT_BUTTONS), rng.randint(0, 1)))
+        events.append((evdev.ecodes.EV_SYN, evdev.ecodes.SYN_REPORT, 0))
+
+    # Sticks centred and buttons up at the end, so a repeating script never leaves a valve open
+    for code in (evdev.ecodes.ABS_X, evdev.ecodes.ABS_Y, evdev.ecodes.ABS_RX):
+        events.append((evdev.ecodes.EV_ABS, code, 0))
+    for code in SCRIPT_BUTTONS:
+        events.append((evdev.ecodes.EV_KEY, code, 0))
+    events.append((evdev.ecodes.EV_SYN, evdev.ecodes.SYN_REPORT, 0))
+    return events
+
+class ScriptedGamepad:
+    def __init__(self, events, rate=GAMEPAD_RATE, repeat=False, name=GAMEPAD_NAME):
+        # Stands in for an evdev.InputDevice, events are (type, code, value) and a report ends at each SYN_REPORT
+        self.events = [evdev.InputEvent(0, 0, *event) for event in events]
+        self.interval = 1.0 / rate if rate else 0.0 # 0 replays as fast as possible
+        self.repeat = repeat
+        self.name = name
+        self.path = "/dev/input/scripted"
+        self.closed = False
+        self.keys = set() # Pressed key codes, for active_keys
+        self.axes = {} # Axis code: last value, for absinfo
+
+        # Statistics
+        self.sentEvents = 0
+        self.sentReports = 0
+
+    def reports(self):
+        # Events are grouped per report so each report is delivered at once, as the kernel does
+        report = []
+        while not self.closed:
+            for event in self.events:
+                report.append(event)
+                if event.type == evdev.ecodes.EV_SYN and event.code == evdev.ecodes.SYN_REPORT:
+                    yield report
+                    report = []
+            if report:
+                yield report
+                report = []
+            if not self.repeat:
+                return
+
+    def stamp(self, report):
+        now = time.time()
+        sec = int(now)
+        usec = int((now - sec) * 1e6)
+        self.sentEvents += len(report)
+        self.sentReports += 1
+        for event in report:
+            if event.type == evdev.ecodes.EV_KEY:
+                if event.value:
+                    self.keys.add(event.code)
+                else:
+                    self.keys.discard(event.code)
+            elif event.type == evdev.ecodes.EV_ABS:
+                self.axes[event.code] = event.value
+        return [evdev.InputEvent(sec, usec, event.type, event.code, event.value) for event in report]
+
+    def read_loop(self):
+        # Absolute deadlines, a slow consumer is not paced any slower
+        deadline = time.monotonic()
+        for report in self.reports():
+            if self.interval:
+                deadline += self.interval
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            yield from self.stamp(report)
+
+    async def async_read_loop(self):
+        deadline = time.monotonic()
+        for report in self.reports():
+            if self.interval:
+                deadline += self.interval
+                await asyncio.sleep(max(0.0, deadline - time.monotonic()))
+            else:
+                await asyncio.sleep(0) # Let the other device tasks run
+            for event in self.stamp(report):
+                yield event
+
+    def active_keys(self):
+        return list(self.keys)
+
+    def absinfo(self, code):
+        # Same fields as evdev, the F310 sticks span the full signed 16 bit range
+        return evdev.AbsInfo(self.axes.get(code, 0), -32768, 32767, 16, 128, 0)
+
+    def close(self):
+        self.closed = True
+
+    def stats(self):
+        return {"sentEvents": self.sentEvents, "sentReports": self.sentReports}
+
+def make_packet(dtype, values, extra=0):
+    # WitMotion packet: header, type, four signed shorts, checksum
+    scale = 32768.0 / FULL_SCALE[dtype]
+    shorts = [max(-32768, min(32767, round(value * scale))) for value in values]
+    body = struct.pack("<BBhhhh", 0x55, dtype, *shorts, extra)
+    return body + bytes([sum(body) & 0xFF])
+
+class FakeWitMotion:
+    def __init__(self, rate=100, types=(0x51, 0x52, 0x53), yawRate=20.0, tiltAmplitude=10.0, tiltPeriod=8.0, noise=1.0):
+        # Emits WitMotion packets on a pty, GyroscopeHandler(port=fake.port) reads it like /dev/ttyUSB0
+        for dtype in types:
+            if dtype not in FULL_SCALE:
+                raise ValueError(f"Unsupported packet type {dtype:#x}, expected one of {[hex(t) for t in FULL_SCALE]}")
+        self.interval = 1.0 / rate
+        self.types = types
+        self.yawRate = yawRate # deg/s
+        self.tiltAmplitude = tiltAmplitude # deg, pitch and roll rock about level
+        self.tiltPeriod = tiltPeriod # s
+        self.noise = noise # Multiplies NOISE, 0 for clean readings
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+        self.rng = np.random.default_rng(0)
+
+        self.running = False
+        self.thread = None
+
+        # Statistics
+        self.packets = 0
+        self.overruns = 0 # Packets lost because the reader fell behind, like a full UART FIFO
+        self.commandBytes = 0 # Configuration writes from the handler, accepted and ignored
+        self.startTime = 0.0
+
+    def motion(self, elapsed):
+        # Angles (deg) and body rates (deg/s) of a craft slowly yawing and rocking
+        phase = 2 * math.pi * elapsed / self.tiltPeriod
+        rateScale = 2 * math.pi / self.tiltPeriod
+        roll = self.tiltAmplitude * math.sin(phase)
+        pitch = 0.5 * self.tiltAmplitude * math.sin(0.5 * phase)
+        yaw = (self.yawRate * elapsed + 180.0) % 360.0 - 180.0
+        rates = [self.tiltAmplitude * rateScale * math.cos(phase),
+                 0.25 * self.tiltAmplitude * rateScale * math.cos(0.5 * phase),
+                 self.yawRate]
+        return [roll, pitch, yaw], rates
+
+    def sample(self, elapsed):
+        (roll, pitch, yaw), rates = self.motion(elapsed)
+        r, p, y = math.radians(roll), math.radians(pitch), math.radians(yaw)
+        values = {
+            0x51: [-GRAVITY * math.sin(p), GRAVITY * math.sin(r) * math.cos(p), GRAVITY * math.cos(r) * math.cos(p)],
+            0x52: rates,
+            0x53: [roll, pitch, yaw],
+            0x54: [400 * math.cos(-y), 400 * math.sin(-y), -300], # Field pointing north and down
+        }
+        packets = []
+        for dtype in self.types:
+            noise = self.noise * NOISE[dtype] * self.rng.uniform(-1, 1, 3)
+            packets.append(make_packet(dtype, [value + offset for value, offset in zip(values[dtype], noise)]))
+        return b"".join(packets)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.emit_loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def emit_loop(self):
+        self.startTime = time.monotonic()
+        deadline = self.startTime
+        while self.running:
+            deadline += self.interval
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.drain_commands()
+            data = self.sample(deadline - self.startTime)
+            try:
+                written = os.write(self.master, data)
+            except BlockingIOError:
+                written = 0
+            except OSError:
+                return # Closed
+            if written < len(data):
+                self.overruns += len(self.types) - written // 11
+            self.packets += written // 11
+
+    def drain_commands(self):
+        try:
+            while True:
+                data = os.read(self.master, 1024)
+                if not data:
+                    return
+                self.commandBytes += len(data)
+        except (BlockingIOError, OSError):
+            return
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def stats(self):
+        elapsed = time.monotonic() - self.startTime if self.startTime else 0.0
+        return {
+            "port": self.port,
+            "packets": self.packets,
+            "packetRate": self.packets / elapsed if elapsed else 0.0,
+            "overruns": self.overruns,
+            "commandBytes": self.commandBytes,
+        }
+
+class SyntheticCapture:
+    def __init__(self, source=None, width=640, height=480, fps=30.0, drift=(40.0, 10.0), loop=True):
+        # Drop-in for cv2.VideoCapture, pass it as a camera index. Frames come from a video file when
+        # source is a path, otherwise from a textured scene drifting by drift (px/s) so optical flow sees motion
+        self.source = source
+        self.drift = drift
+        self.loop = loop
+        self.fourcc = cv2.VideoWriter_fourcc(*"MJPG")
+        self.buffersize = 1
+        self.cap = None
+        self.opened = True
+        if source is not None:
+            self.cap = cv2.VideoCapture(source)
+            self.opened = self.cap.isOpened()
+            width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or width
+            height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or height
+            fps = self.cap.get(cv2.CAP_PROP_FPS) or fps
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.scene = None
+        self.frames = 0
+        self.deadline = None
+
+    def __getstate__(self):
+        # Sent to a spawned camera process, the file is opened again there
+        state = dict(self.__dict__)
+        state["cap"] = None
+        state["scene"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.source is not None:
+            self.cap = cv2.VideoCapture(self.source)
+            self.opened = self.cap.isOpened()
+
+    def render_scene(self):
+        # Rendered once per size and tiled 2x2, each frame is a crop of it that wraps around seamlessly
+        rng = np.random.default_rng(0)
+        tile = cv2.GaussianBlur(rng.integers(0, 255, (self.height, self.width, 3), dtype=np.uint8), (7, 7), 0)
+        return np.tile(tile, (2, 2, 1))
+
+    def isOpened(self):
+        return self.opened
+
+    def get(self, prop):
+        return {
+            cv2.CAP_PROP_FPS: self.fps,
+            cv2.CAP_PROP_FRAME_WIDTH: self.width,
+            cv2.CAP_PROP_FRAME_HEIGHT: self.height,
+            cv2.CAP_PROP_FOURCC: self.fourcc,
+            cv2.CAP_PROP_BUFFERSIZE: self.buffersize,
+        }.get(prop, 0.0)
+
+    def set(self, prop, value):
+        # Profiles are honoured for generated frames, a file keeps its own size and rate
+        if prop == cv2.CAP_PROP_FOURCC:
+            self.fourcc = int(value)
+        elif prop == cv2.CAP_PROP_BUFFERSIZE:
+            self.buffersize = int(value)
+        elif self.cap is not None:
+            return False
+        elif prop == cv2.CAP_PROP_FRAME_WIDTH:
+            self.width = int(value)
+            self.scene = None
+        elif prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            self.height = int(value)
+            self.scene = None
+        elif prop == cv2.CAP_PROP_FPS:
+            self.fps = float(value)
+        else:
+            return False
+        return True
+
+    def wait_frame(self):
+        # Block like a driver delivering frames at the camera's rate
+        now = time.monotonic()
+        if self.deadline is None or now - self.deadline > 1.0:
+            self.deadline = now # First read, or the reader stalled, don't burst to catch up
+        self.deadline += 1.0 / self.fps
+        delay = self.deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def read(self, image=None):
+        if not self.opened:
+            return False, None
+        self.wait_frame()
+        if self.cap is not None:
+            ret, frame = self.cap.read(image)
+            if not ret and self.loop:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ret, frame = self.cap.read(image)
+        else:
+            if self.scene is None:
+                self.scene = self.render_scene()
+            elapsed = self.frames / self.fps
+            x = int(self.drift[0] * elapsed) % self.width
+            y = int(self.drift[1] * elapsed) % self.height
+            crop = self.scene[y:y + self.height, x:x + self.width]
+            if image is not None and image.shape == crop.shape:
+                np.copyto(image, crop)
+                frame = image
+            else:
+                frame = crop.copy()
+            ret = True
+        if ret:
+            self.frames += 1
+        return ret, frame
+
+    def release(self):
+        self.opened = False
+        if self.cap is not None:
+            self.cap.release()
@@ -0,0 +1,152 @@
+import threading
+import time
+from .attitude import wrap_angle
+
+# Axis: (attitude index, command that increases the angle, command that decreases it)
+AXES = {
+    "pitch": (0, "Pitch Up", "Pitch Down"),
+    "roll": (1, "Roll Right", "Roll Left"),
+    "yaw": (2, "Left Yaw", "Right Yaw"),
+}
+
+class AxisController:
+    def __init__(self, kp=1.0, ki=0.0, kd=0.3, deadband=2.0, minOnTime=0.05, integralLimit=20.0):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.deadband = deadband # Output below this leaves the valves closed
+        self.minOnTime = minOnTime # Seconds a fired solenoid stays open
+        self.integralLimit = integralLimit
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.output = 0.0
+        self.direction = 0 # -1, 0 or 1
+        self.firedAt = 0.0
+
+    def update(self, error, rate, dt, now):
+        # Derivative on the measured rate, no kick when the setpoint changes
+        self.integral = max(-self.integralLimit, min(self.integralLimit, self.integral + error * dt))
+        self.output = self.kp * error + self.ki * self.integral - self.kd * rate
+
+        # Bang-bang with a deadband, a firing solenoid is held for at least minOnTime
+        if self.direction and now - self.firedAt < self.minOnTime:
+            return self.direction
+        if self.output > self.deadband:
+            direction = 1
+        elif self.output < -self.deadband:
+            direction = -1
+        else:
+            direction = 0
+        if direction and direction != self.direction:
+            self.firedAt = now
+        self.direction = direction
+        return direction
+
+class AttitudeHold:
+    def __init__(self, gyro, valves, rate=50, commandCallback=None, gains=None, bus=None):
+        self.gyro = gyro
+        self.valves = valves
+        self.period = 1.0 / rate
+        self.commandCallback = commandCallback
+        self.bus = bus
+        self.axes = {axis: AxisController(**(gains or {}).get(axis, {})) for axis in AXES}
+        self.setpoint = [0.0, 0.0, 0.0]
+        self.activeCommands = set()
+        self.running = False
+        self.thread = None
+
+        # Statistics
+        self.ticks = 0
+        self.overruns = 0 # Periods missed because a tick ran late
+        self.maxJitter = 0.0 # Worst wake-up delay after the scheduled tick (s)
+        self.jitter = 0.0 # Smoothed wake-up delay (s)
+        self.loopTime = 0.0 # Smoothed time spent in a tick (s)
+
+    def toggle(self):
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+        return self.running
+
+    def start(self):
+        if self.running:
+            return
+        # Hold the attitude the craft has now
+        self.setpoint = list(self.gyro.attitude())
+        for controller in self.axes.values():
+            controller.reset()
+        self.ticks = self.overruns = 0
+        self.maxJitter = self.jitter = 0.0
+        self.running = True
+        self.thread = threading.Thread(target=self.control_loop, daemon=True)
+        self.thread.start()
+
+    def control_loop(self):
+        # Deadlines are absolute so the period doesn't drift with loop time
+        deadline = time.monotonic()
+        while self.running:
+            now = time.monotonic()
+            late = now - deadline
+            self.maxJitter = max(self.maxJitter, late)
+            self.jitter = 0.9 * self.jitter + 0.1 * late if self.ticks else late
+
+            self.step(now)
+            self.ticks += 1
+
+            finished = time.monotonic()
+            self.loopTime = 0.9 * self.loopTime + 0.1 * (finished - now) if self.loopTime else finished - now
+            deadline += self.period
+            if finished > deadline:
+                # Skip the periods we missed instead of running a burst of late ticks
+                missed = int((finished - deadline) / self.period) + 1
+                self.overruns += missed
+                deadline += missed * self.period
+            time.sleep(max(0.0, deadline - time.monotonic()))
+        self.apply(set())
+
+    def step(self, now):
+        attitude = self.gyro.attitude()
+        rates = self.gyro.values[0x52]
+        commands = set()
+        for axis, (index, increase, decrease) in AXES.items():
+            error = wrap_angle(self.setpoint[index] - attitude[index])
+            direction = self.axes[axis].update(error, rates[index], self.period, now)
+            if direction > 0:
+                commands.add(increase)
+            elif direction < 0:
+                commands.add(decrease)
+        self.apply(commands)
+
+    def apply(self, commands):
+        # Corrections are combined with the pilot's requests per axis, one write per tick
+        self.valves.set_commands("attitude hold", commands)
+
+        if self.commandCallback:
+            # Runs on the hold thread, GUI callbacks have to hand off to their own loop
+            for command in self.activeCommands - commands:
+                self.commandCallback(command, 0)
+            for command in commands - self.activeCommands:
+                self.commandCallback(command, 1)
+        if self.bus and commands != self.activeCommands:
+            self.bus.publish("cmd.hold", frozenset(commands))
+        self.activeCommands = commands
+
+    def stats(self):
+        return {
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "jitter": self.jitter,
+            "maxJitter": self.maxJitter,
+            "loopTime": self.loopTime,
+            "outputs": {axis: controller.output for axis, controller in self.axes.items()},
+        }
+
+    def stop(self):
+        self.running = False
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1.0)
+        self.thread = None
+        self.apply(set())
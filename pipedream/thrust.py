@@ -0,0 +1,105 @@
+import threading
+import time
+
+class ThrustScheduler:
+    def __init__(self, valves, period=0.1, minOnTime=0.02):
+        self.valves = valves
+        self.period = period # Seconds per PWM cycle
+        self.minOnTime = minOnTime # Shortest pulse the solenoids reliably open for
+        self.lock = threading.Lock()
+        self.duties = {} # Command: commanded duty, 0 to 1
+        self.running = False
+        self.thread = None
+
+        # Statistics
+        self.cycles = 0
+        self.overruns = 0 # Cycles that started late by more than a whole period
+        self.jitter = 0.0 # Smoothed delay of pin switches after their scheduled time (s)
+        self.maxJitter = 0.0
+        self.actualDuties = {} # Command: measured duty of the last cycle
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.pwm_loop, daemon=True)
+        self.thread.start()
+
+    def set_duty(self, command, duty):
+        duty = max(0.0, min(1.0, duty))
+        with self.lock:
+            if duty:
+                self.duties[command] = duty
+            else:
+                self.duties.pop(command, None)
+
+    def on_time(self, duty):
+        # Pulses the valve can't produce are rounded to the nearest one it can
+        onTime = duty * self.period
+        if onTime < self.minOnTime:
+            return self.minOnTime if onTime >= self.minOnTime / 2 else 0.0
+        if self.period - onTime < self.minOnTime:
+            return self.period
+        return onTime
+
+    def wait_until(self, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        late = time.monotonic() - deadline
+        self.jitter = 0.99 * self.jitter + 0.01 * late
+        self.maxJitter = max(self.maxJitter, late)
+        return late
+
+    def switch(self, commands):
+        # Combined with the other owners per axis, shared pins stay open while any requested axis needs them
+        self.valves.set_commands("thrust", commands)
+
+    def pwm_loop(self):
+        # Cycle starts are absolute, so switching time never accumulates into drift
+        cycleStart = time.monotonic()
+        while self.running:
+            self.wait_until(cycleStart)
+            with self.lock:
+                schedule = [(self.on_time(duty), command) for command, duty in self.duties.items()]
+            schedule = sorted(entry for entry in schedule if entry[0] > 0)
+
+            # Everything opens at the start of the cycle, then closes in order of on-time
+            openedAt = time.monotonic()
+            self.switch([command for _, command in schedule])
+            actualDuties = {}
+            for index, (onTime, command) in enumerate(schedule):
+                if onTime >= self.period:
+                    # Held open straight into the next cycle
+                    actualDuties[command] = 1.0
+                    continue
+                self.wait_until(cycleStart + onTime)
+                self.switch([other for _, other in schedule[index + 1:]])
+                actualDuties[command] = (time.monotonic() - openedAt) / self.period
+            self.actualDuties = actualDuties
+            self.cycles += 1
+
+            cycleStart += self.period
+            now = time.monotonic()
+            if now - cycleStart > self.period:
+                # Too far behind to catch up, start again from now
+                self.overruns += 1
+                cycleStart = now
+        self.switch([])
+
+    def stats(self):
+        with self.lock:
+            duties = dict(self.duties)
+        return {
+            "cycles": self.cycles,
+            "overruns": self.overruns,
+            "jitter": self.jitter,
+            "maxJitter": self.maxJitter,
+            "commandedDuties": duties,
+            "actualDuties": dict(self.actualDuties),
+        }
+
+    def stop(self):
+        self.running = False
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1.0)
+        self.thread = None
+        self.switch([])
@@ -0,0 +1,170 @@
+import threading
+import time
+import gpiozero
+from gpiozero.pins.mock import MockFactory
+from .allocation import ALLOCATION_AXES, ThrustAllocator
+
+try:
+    import lgpio
+except ImportError:
+    lgpio = None
+
+class ValveManager:
+    def __init__(self, commands, lines=None, chip=0, axes=ALLOCATION_AXES):
+        # commands maps a command label to its OutputDevices, bit per solenoid line in GPIO order.
+        # lines maps each GPIO number to its line offset on gpiochip chip, given only to use group writes
+        self.devices = {device.pin.number: device for group in commands.values() for device in group}
+        self.pins = sorted(self.devices)
+        self.bits = {pin: 1 << index for index, pin in enumerate(self.pins)}
+        self.commandMasks = {command: sum({self.bits[device.pin.number] for device in group}) for command, group in commands.items()}
+
+        self.lock = threading.Lock()
+        self.owners = {} # Owner: commands it holds open
+        self.requests = {} # Owner: -1, 0 or 1 per allocation axis
+        self.extras = {} # Owner: lines of its commands outside the allocation axes
+        self.mask = 0 # Lines currently driven high
+
+        # Every owner's requests are combined per axis, then resolved with one table lookup
+        self.allocator = ThrustAllocator(self, axes)
+
+        # One register write for every line when lgpio is available, mock pins stay with gpiozero
+        mockPins = isinstance(gpiozero.Device.pin_factory, MockFactory)
+        self.handle = self.claim_group(chip, lines) if lines and lgpio and not mockPins else None
+
+        # Statistics
+        self.writes = 0
+        self.pinWrites = 0
+        self.latency = 0.0 # Request to write complete including the lock wait, smoothed (s)
+        self.maxLatency = 0.0
+        self.lockWait = 0.0 # Request to lock acquired, smoothed (s)
+        self.maxLockWait = 0.0
+        self.lockRequests = 0
+        self.skew = 0.0 # First to last line switched in one write, smoothed (s)
+        self.maxSkew = 0.0
+
+    def claim_group(self, chip, lines):
+        # Group in pin order so bit i of a write is self.pins[i]
+        self.groupLines = [lines[pin] for pin in self.pins]
+
+        # gpiozero's lgpio factory holds every line it opened (all of PINOUT at import), release them to claim the group
+        for device in self.devices.values():
+            device.close()
+        handle = None
+        try:
+            handle = lgpio.gpiochip_open(chip)
+            lgpio.group_claim_output(handle, self.groupLines, [0] * len(self.groupLines))
+            return handle
+        except lgpio.error:
+            if handle is not None:
+                lgpio.gpiochip_close(handle)
+            # Held by another process, switch the lines one at a time through gpiozero again
+            self.devices = {pin: gpiozero.OutputDevice(pin) for pin in self.pins}
+            return None
+
+    def press(self, owner, command):
+        requested = time.perf_counter()
+        with self.lock:
+            commands = self.owners.get(owner, set()) | {command}
+            self.update(owner, commands, requested)
+
+    def release(self, owner, command):
+        requested = time.perf_counter()
+        with self.lock:
+            commands = self.owners.get(owner, set()) - {command}
+            self.update(owner, commands, requested)
+
+    def set_commands(self, owner, commands):
+        # Replace everything an owner requests in one write
+        requested = time.perf_counter()
+        with self.lock:
+            self.update(owner, set(commands), requested)
+
+    def release_all(self, owner):
+        self.set_commands(owner, ())
+
+    def update(self, owner, commands, requested):
+        wait = time.perf_counter() - requested
+        self.lockWait = 0.9 * self.lockWait + 0.1 * wait if self.lockRequests else wait
+        self.maxLockWait = max(self.maxLockWait, wait)
+        self.lockRequests += 1
+        if commands == self.owners.get(owner):
+            return
+        self.owners[owner] = commands
+        self.requests[owner] = self.allocator.request(command for command in commands if command in self.allocator.signs)
+        self.extras[owner] = self.commands_mask(command for command in commands if command not in self.allocator.signs)
+        self.write(requested)
+
+    def commands_mask(self, commands):
+        mask = 0
+        for command in commands:
+            mask |= self.commandMasks[command]
+        return mask
+
+    def desired_mask(self):
+        # Owners pulling one axis both ways cancel out, as opposing commands from one owner do
+        request = [0] * len(self.allocator.axes)
+        for ownerRequest in self.requests.values():
+            request = [total + value for total, value in zip(request, ownerRequest)]
+        mask = self.allocator.lookup([(total > 0) - (total < 0) for total in request])
+        for extra in self.extras.values():
+            mask |= extra
+        return mask
+
+    def write(self, requested):
+        desired = self.desired_mask()
+        changed = desired ^ self.mask
+        if not changed:
+            return
+
+        start = time.perf_counter()
+        if self.handle is not None:
+            lgpio.group_write(self.handle, self.groupLines[0], desired, changed)
+        else:
+            # Only the lines that changed, one call each
+            for pin in self.pins:
+                bit = self.bits[pin]
+                if changed & bit and not desired & bit:
+                    self.devices[pin].off()
+            for pin in self.pins:
+                bit = self.bits[pin]
+                if changed & bit and desired & bit:
+                    self.devices[pin].on()
+        finished = time.perf_counter()
+        self.mask = desired
+
+        skew = finished - start
+        latency = finished - requested
+        self.skew = 0.9 * self.skew + 0.1 * skew if self.writes else skew
+        self.latency = 0.9 * self.latency + 0.1 * latency if self.writes else latency
+        self.maxSkew = max(self.maxSkew, skew)
+        self.maxLatency = max(self.maxLatency, latency)
+        self.writes += 1
+        self.pinWrites += bin(changed).count("1")
+
+    def open_pins(self):
+        return [pin for pin in self.pins if self.mask & self.bits[pin]]
+
+    def stats(self):
+        return {
+            "groupWrite": self.handle is not None,
+            "writes": self.writes,
+            "pinWrites": self.pinWrites,
+            "latency": self.latency,
+            "maxLatency": self.maxLatency,
+            "lockWait": self.lockWait,
+            "maxLockWait": self.maxLockWait,
+            "skew": self.skew,
+            "maxSkew": self.maxSkew,
+            "openPins": self.open_pins(),
+        }
+
+    def close(self):
+        with self.lock:
+            self.owners.clear()
+            self.requests.clear()
+            self.extras.clear()
+            self.write(time.perf_counter())
+            if self.handle is not None:
+                lgpio.group_free(self.handle, self.groupLines[0])
+                lgpio.gpiochip_close(self.handle)
+                self.handle = None
@@ -0,0 +1,299 @@
+import math
+import multiprocessing
+import os
+import threading
+import time
+import cv2
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Per worker process, created on first use
+_detector = None
+
+def marker_corners(markerLength):
+    half = markerLength / 2.0
+    return np.array([[-half, half, 0], [half, half, 0], [half, -half, 0], [-half, -half, 0]], dtype=np.float32)
+
+def camera_matrix(width, height, fieldOfView):
+    # Pinhole estimate from the horizontal field of view, no calibration needed
+    focal = (width / 2.0) / math.tan(math.radians(fieldOfView) / 2.0)
+    return np.array([[focal, 0, width / 2.0], [0, focal, height / 2.0], [0, 0, 1]], dtype=np.float64)
+
+def detect_marker(gray, dictionary, markerLength, fieldOfView):
+    global _detector
+    if _detector is None:
+        aruco = cv2.aruco
+        _detector = aruco.ArucoDetector(aruco.getPredefinedDictionary(getattr(aruco, dictionary)), aruco.DetectorParameters())
+
+    corners, ids, _ = _detector.detectMarkers(gray)
+    if ids is None:
+        return None
+
+    # Closest marker is the largest one in the image
+    areas = [cv2.contourArea(c.reshape(4, 2)) for c in corners]
+    index = int(np.argmax(areas))
+    height, width = gray.shape
+    ok, rvec, tvec = cv2.solvePnP(marker_corners(markerLength), corners[index].reshape(4, 2),
+                                  camera_matrix(width, height, fieldOfView), None, flags=cv2.SOLVEPNP_IPPE_SQUARE)
+    if not ok:
+        return None
+
+    x, y, z = tvec.ravel()
+    rotation, _ = cv2.Rodrigues(rvec)
+    return {
+        "id": int(ids.ravel()[index]),
+        "range": float(math.sqrt(x * x + y * y + z * z)),
+        "bearing": math.degrees(math.atan2(x, z)),
+        "roll": math.degrees(math.atan2(rotation[1, 0], rotation[0, 0])),
+    }
+
+def detect_job(gray, dictionary, markerLength, fieldOfView):
+    # Workers report their CPU time with each result, the parent can't see it until they exit
+    return detect_marker(gray, dictionary, markerLength, fieldOfView), os.getpid(), time.process_time()
+
+class MarkerDetector:
+    def __init__(self, markerLength=0.1, width=320, workers=2, fieldOfView=60.0, dictionary="DICT_4X4_50"):
+        self.markerLength = markerLength
+        self.width = width
+        self.workers = workers
+        self.fieldOfView = fieldOfView
+        self.dictionary = dictionary
+
+        # Spawned, a fork would inherit locks held by the capture, Tk and device threads
+        self.context = multiprocessing.get_context("spawn")
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=self.context)
+        self.lock = threading.Lock()
+        self.inFlight = 0
+        self.workerCpu = {} # Latest CPU time reported by each live worker (s)
+
+        # Latest result: pose (None if no marker), capture timestamp, completion timestamp
+        self.result = (None, 0.0, 0.0)
+
+        # Statistics
+        self.submitted = 0
+        self.skipped = 0 # Frames dropped because every worker was busy
+        self.completed = 0
+        self.errors = 0
+        self.restarts = 0 # Pools replaced after a worker died
+        self.throughput = 0.0 # Detections finished per second
+        self.latency = 0.0 # Capture to result, smoothed
+        self.windowStart = time.monotonic()
+        self.windowCompleted = 0
+
+    def submit(self, frame, timestamp):
+        with self.lock:
+            if self.inFlight >= self.workers:
+                self.skipped += 1
+                return False
+            self.inFlight += 1
+            self.submitted += 1
+
+        try:
+            # Downscale before the grayscale conversion, workers only see small frames
+            height, width = frame.shape[:2]
+            scale = self.width / width
+            small = cv2.resize(frame, (self.width, max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+            future = self.pool.submit(detect_job, gray, self.dictionary, self.markerLength, self.fieldOfView)
+        except Exception as error:
+            # Nothing is in flight, give the slot back or every later frame would be skipped
+            with self.lock:
+                self.inFlight -= 1
+                self.errors += 1
+            if isinstance(error, BrokenProcessPool):
+                self.restart()
+            return False
+        future.add_done_callback(lambda future: self.finished(future, timestamp))
+        return True
+
+    def restart(self):
+        # A worker died, the whole pool is unusable after that
+        with self.lock:
+            pool = self.pool
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=self.context)
+            self.restarts += 1
+            # Dead workers are counted in os.times() once the old pool reaps them
+            self.workerCpu = {}
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def finished(self, future, timestamp):
+        now = time.monotonic()
+        with self.lock:
+            self.inFlight -= 1
+            if future.cancelled() or future.exception():
+                self.errors += 1
+                return
+            pose, pid, cpuTime = future.result()
+            self.workerCpu[pid] = cpuTime
+            self.result = (pose, timestamp, now)
+            self.completed += 1
+            self.latency = 0.9 * self.latency + 0.1 * (now - timestamp) if self.latency else now - timestamp
+
+            self.windowCompleted += 1
+            if now - self.windowStart >= 1.0:
+                self.throughput = self.windowCompleted / (now - self.windowStart)
+                self.windowStart = now
+                self.windowCompleted = 0
+
+    def child_cpu_time(self):
+        with self.lock:
+            return sum(self.workerCpu.values())
+
+    def overlay_lines(self):
+        pose, timestamp, _ = self.result
+        if not timestamp:
+            return []
+        age = time.monotonic() - timestamp
+        if pose:
+            lines = [f"Marker {pose['id']}: {pose['range']:.2f} m  brg {pose['bearing']:+.1f}  roll {pose['roll']:+.1f}"]
+        else:
+            lines = ["No marker"]
+        lines.append(f"Detect {self.throughput:.1f}/s  latency {1000 * self.latency:.0f} ms  age {1000 * age:.0f} ms")
+        return lines
+
+    def stats(self):
+        return {
+            "submitted": self.submitted,
+            "skipped": self.skipped,
+            "completed": self.completed,
+            "errors": self.errors,
+            "restarts": self.restarts,
+            "throughput": self.throughput,
+            "latency": self.latency,
+        }
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.workerCpu = {}
+
+# Data type used for flow results on the gyroscope style callback
+FLOW_TYPE = "flow"
+
+class OpticalFlowEstimator:
+    def __init__(self, camera, dataCallback=None, width=320, distance=1.0, fieldOfView=60.0,
+                 maxFeatures=100, minFeatures=40, winSize=(21, 21), maxLevel=3, bus=None):
+        self.camera = camera
+        self.dataCallback = dataCallback
+        self.bus = bus
+        self.width = width
+        self.distance = distance # Range to the target when no marker is visible (m)
+        self.fieldOfView = fieldOfView
+        self.maxFeatures = maxFeatures
+        self.minFeatures = minFeatures
+        self.winSize = winSize
+        self.maxLevel = maxLevel
+        self.running = False
+        self.thread = None
+
+        # Preallocated once the frame size is known
+        self.small = None
+        self.grays = None # Two buffers, current and previous frame
+        self.focal = None
+
+        # Carried from one frame to the next
+        self.previousGray = None
+        self.previousPoints = None
+        self.previousTimestamp = 0.0
+        self.sequence = 0
+
+        # Latest estimate: x velocity, y velocity (m/s), tracked features
+        self.values = [0.0, 0.0, 0]
+
+        # Statistics
+        self.processedFrames = 0
+        self.detections = 0 # Times new features had to be found
+        self.processFps = 0.0
+        self.processTime = 0.0 # Seconds per frame, smoothed
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.flow_loop, daemon=True)
+        self.thread.start()
+
+    def flow_loop(self):
+        windowStart = time.monotonic()
+        windowFrames = 0
+        while self.running:
+            frame, timestamp, sequence = self.camera.latest
+            if frame is None or sequence == self.sequence:
+                time.sleep(0.002)
+                continue
+            self.sequence = sequence
+
+            start = time.perf_counter()
+            self.process(frame, timestamp)
+            elapsed = time.perf_counter() - start
+            self.processTime = 0.9 * self.processTime + 0.1 * elapsed if self.processTime else elapsed
+
+            windowFrames += 1
+            now = time.monotonic()
+            if now - windowStart >= 1.0:
+                self.processFps = windowFrames / (now - windowStart)
+                windowStart = now
+                windowFrames = 0
+
+    def allocate(self, frame):
+        height, width = frame.shape[:2]
+        smallHeight = max(1, int(height * self.width / width))
+        self.small = np.empty((smallHeight, self.width, 3), dtype=np.uint8)
+        self.grays = [np.empty((smallHeight, self.width), dtype=np.uint8) for _ in range(2)]
+        self.focal = (self.width / 2.0) / math.tan(math.radians(self.fieldOfView) / 2.0)
+
+    def target_distance(self):
+        detector = getattr(self.camera, "detector", None)
+        if detector:
+            pose = detector.result[0]
+            if pose:
+                return pose["range"]
+        return self.distance
+
+    def process(self, frame, timestamp):
+        if self.small is None:
+            self.allocate(frame)
+        # Convert into whichever buffer doesn't hold the previous frame
+        gray = self.grays[1] if self.previousGray is self.grays[0] else self.grays[0]
+        cv2.resize(frame, (self.width, self.small.shape[0]), dst=self.small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.small, cv2.COLOR_BGR2GRAY, dst=gray)
+
+        points = None
+        if self.previousGray is not None and self.previousPoints is not None and len(self.previousPoints):
+            points, status, _ = cv2.calcOpticalFlowPyrLK(self.previousGray, gray, self.previousPoints, None,
+                                                         winSize=self.winSize, maxLevel=self.maxLevel)
+            tracked = status.ravel() == 1
+            points = points[tracked]
+            if len(points):
+                displacement = np.median(points - self.previousPoints[tracked], axis=0).ravel()
+                dt = timestamp - self.previousTimestamp
+                if dt > 0:
+                    # Pixels to metres at the target distance, image motion is opposite to ours
+                    scale = self.target_distance() / self.focal / dt
+                    self.values = [-displacement[0] * scale, -displacement[1] * scale, len(points)]
+                    self.processedFrames += 1
+                    if self.dataCallback:
+                        self.dataCallback(FLOW_TYPE, self.values)
+                    if self.bus:
+                        self.bus.publish("vision.flow", self.values)
+
+        # Only look for new features once too many have been lost
+        if points is None or len(points) < self.minFeatures:
+            points = cv2.goodFeaturesToTrack(gray, self.maxFeatures, 0.01, 8)
+            self.detections += 1
+
+        self.previousGray = gray
+        self.previousPoints = points
+        self.previousTimestamp = timestamp
+
+    def stats(self):
+        return {
+            "processedFrames": self.processedFrames,
+            "detections": self.detections,
+            "processFps": self.processFps,
+            "processTime": self.processTime,
+            "features": self.values[2],
+        }
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1.0)
@@ -0,0 +1,186 @@
+import collections
+import cv2
+import datetime
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+class ImageWriter:
+    def __init__(self, directory="./images", workers=2, maxPending=8):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        # Bounded pool, captures are rejected instead of queueing without limit
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ImageWriter")
+        self.slots = threading.BoundedSemaphore(maxPending)
+        self.lock = threading.Lock()
+        self.lastTimestamp = None
+        self.collisions = 0
+
+        # Statistics
+        self.written = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def filename(self, prefix="image"):
+        timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        with self.lock:
+            # Same microsecond as the previous capture, add a suffix
+            if timestamp == self.lastTimestamp:
+                self.collisions += 1
+                name = f"{prefix}_{timestamp}-{self.collisions}.jpg"
+            else:
+                self.collisions = 0
+                name = f"{prefix}_{timestamp}.jpg"
+            self.lastTimestamp = timestamp
+        return os.path.join(self.directory, name)
+
+    def submit(self, frame, callback=None, filepath=None):
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            if callback:
+                callback(None, False)
+            return None
+
+        filepath = filepath or self.filename()
+        self.executor.submit(self.write, frame, filepath, callback)
+        return filepath
+
+    def write(self, frame, filepath, callback):
+        # Runs in the pool, where an exception would be lost, so any failure is reported as not ok
+        ok = False
+        try:
+            ok = cv2.imwrite(filepath, frame)
+        except Exception:
+            pass
+        finally:
+            self.slots.release()
+
+        with self.lock:
+            if ok:
+                self.written += 1
+            else:
+                self.failed += 1
+        if callback:
+            callback(filepath, ok)
+
+    def close(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+class Recording:
+    def __init__(self, filepath):
+        # One file, with its own queue so a new recording can start while this one drains
+        self.filepath = filepath
+        self.queue = collections.deque()
+        self.stopping = threading.Event()
+        self.finished = threading.Event() # Set once the file is closed
+        self.callback = None
+        self.thread = None
+        self.framesWritten = 0
+
+class VideoRecorder:
+    def __init__(self, directory="./videos", fps=30.0, maxQueue=60, dropPolicy="oldest", fourcc="MJPG"):
+        if dropPolicy not in ("oldest", "newest"):
+            raise ValueError(f"Unknown drop policy {dropPolicy}, expected 'oldest' or 'newest'")
+        self.directory = directory
+        self.fps = fps
+        self.maxQueue = maxQueue
+        self.dropPolicy = dropPolicy
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+
+        # Each recording has a bounded queue between the capture thread and its encoder thread
+        self.condition = threading.Condition()
+        self.recording = False
+        self.current = None # Recording frames are pushed to
+        self.draining = [] # Recordings whose encoder may still be running
+
+        # Statistics
+        self.framesQueued = 0
+        self.framesDropped = 0
+
+    @property
+    def filepath(self):
+        return self.current.filepath if self.current else None
+
+    @property
+    def framesWritten(self):
+        return self.current.framesWritten if self.current else 0
+
+    def start(self, filepath=None):
+        if self.recording:
+            return self.filepath
+        os.makedirs(self.directory, exist_ok=True)
+        if filepath is None:
+            timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+            filepath = os.path.join(self.directory, f"video_{timestamp}.avi")
+        self.framesQueued = self.framesDropped = 0
+
+        recording = Recording(filepath)
+        recording.thread = threading.Thread(target=self.encode_loop, args=(recording,), daemon=True)
+        self.draining = [r for r in self.draining if not r.finished.is_set()] + [recording]
+        with self.condition:
+            self.current = recording
+            self.recording = True
+        recording.thread.start()
+        return filepath
+
+    def push(self, frame):
+        # Never blocks the caller, a full queue drops a frame instead
+        if not self.recording:
+            return False
+        with self.condition:
+            queue = self.current.queue
+            if len(queue) >= self.maxQueue:
+                self.framesDropped += 1
+                if self.dropPolicy == "newest":
+                    return False
+                queue.popleft()
+            queue.append(frame)
+            self.framesQueued += 1
+            self.condition.notify_all()
+        return True
+
+    def encode_loop(self, recording):
+        writer = None
+        while True:
+            with self.condition:
+                while not recording.queue and not recording.stopping.is_set():
+                    self.condition.wait()
+                if not recording.queue:
+                    break
+                frame = recording.queue.popleft()
+
+            if writer is None:
+                # Frame size is only known once the first frame arrives
+                height, width = frame.shape[:2]
+                writer = cv2.VideoWriter(recording.filepath, self.fourcc, self.fps, (width, height))
+            writer.write(frame)
+            recording.framesWritten += 1
+
+        if writer is not None:
+            writer.release()
+        recording.finished.set()
+        if recording.callback:
+            recording.callback(recording.filepath, recording.framesWritten)
+
+    def stop(self, callback=None):
+        # Only signals the encoder, queued frames are still written and callback(filepath, framesWritten)
+        # runs on the encoder thread once the file is closed
+        with self.condition:
+            if not self.recording:
+                return self.filepath
+            self.recording = False
+            self.current.callback = callback
+            self.current.stopping.set()
+            self.condition.notify_all()
+        return self.current.filepath
+
+    def close(self, timeout=5.0):
+        # Shutdown only, waits for every encoder to finish its file
+        self.stop()
+        deadline = time.monotonic() + timeout
+        for recording in self.draining:
+            recording.thread.join(timeout=max(0.0, deadline - time.monotonic()))
+        self.draining = []
@@ -0,0 +1,40 @@
+import math
+import struct
+import time
+from pipedream.attitude import MadgwickFilter
+from pipedream.decoder import decode_batch
+
+RATE = 200 # Hz, fastest WitMotion output rate
+SECONDS = 30
+YAW_RATE = 30.0 # deg/s, sweeps through +-180 deg several times
+PACKETS_PER_READ = 6 # Two samples per read, as the serial thread usually sees them
+
+def make_packet(dtype, values):
+    body = bytes([0x55, dtype]) + struct.pack('<hhhh', *values, 0)
+    return body + bytes([sum(body) & 0xFF])
+
+# Level sensor spinning about z: gravity on z, constant yaw rate, fixed field pointing north and down
+accel = make_packet(0x51, [0, 0, round(9.8 * 32768 / (16 * 9.8))])
+gyro = make_packet(0x52, [0, 0, round(YAW_RATE * 32768 / 2000)])
+samples = SECONDS * RATE
+log = b"".join(make_packet(0x54, [round(400 * math.cos(-math.radians(YAW_RATE * i / RATE))),
+                                  round(400 * math.sin(-math.radians(YAW_RATE * i / RATE))), -300])
+               + accel + gyro for i in range(samples))
+
+chunks = [log[i:i + PACKETS_PER_READ * 11] for i in range(0, len(log), PACKETS_PER_READ * 11)]
+batches = [decode_batch(chunk, 0.0) for chunk in chunks]
+
+for name, useMagnetometer in (("IMU", False), ("MARG", True)):
+    attitude = MadgwickFilter(sampleRate=RATE, useMagnetometer=useMagnetometer)
+    start = time.perf_counter()
+    for i, batch in enumerate(batches):
+        attitude.update_batch(batch)
+        if i == len(batches) // 2:
+            attitude.tare()
+    elapsed = time.perf_counter() - start
+
+    expected = (YAW_RATE * SECONDS / 2) % 360
+    expected = expected - 360 if expected > 180 else expected
+    print(f"{name}: {attitude.updates / elapsed:>10,.0f} updates/s ({1e6 * elapsed / attitude.updates:.1f} us/update),"
+          f" {100 * RATE * elapsed / attitude.updates:.2f}% of one core at {RATE} Hz")
+    print(f"{name}: yaw since tare {attitude.angles()[2]:+.1f} deg, expected {expected:+.1f} deg")
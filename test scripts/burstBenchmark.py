@@ -0,0 +1,44 @@
+import tempfile
+import time
+import numpy as np
+from pipedream.burst import FrameRing
+
+FRAME_SHAPE = (720, 1280, 3)
+SECONDS = 2.0 # Pre-trigger window
+POST_SECONDS = 1.0
+MAX_BYTES = 512 * 2**20
+FRAMES = 600
+FPS = 30
+
+source = np.random.default_rng(0).integers(0, 255, FRAME_SHAPE, dtype=np.uint8)
+
+with tempfile.TemporaryDirectory() as directory:
+    ring = FrameRing.for_budget(FRAME_SHAPE, FPS, SECONDS, POST_SECONDS, MAX_BYTES, directory)
+    print(f"Ring: {ring.slots} slots, {ring.preFrames} pre / {ring.postFrames} post, {ring.nbytes / 2**20:.0f} MiB")
+
+    # Sustained write rate into the slots, as the capture thread does
+    start = time.perf_counter()
+    for i in range(FRAMES):
+        np.copyto(ring.slot(), source)
+        ring.commit(time.monotonic())
+    elapsed = time.perf_counter() - start
+    print(f"Idle:     {FRAMES / elapsed:>8.1f} frames/s")
+
+    # At the camera's rate with a burst being saved in the background, the worst frame is what capture feels
+    done = []
+    ring.trigger(lambda path, count: done.append(count))
+    worst = 0.0
+    deadline = time.monotonic()
+    for i in range(int(FPS * (POST_SECONDS + SECONDS + 1))):
+        deadline += 1 / FPS
+        time.sleep(max(0.0, deadline - time.monotonic()))
+        start = time.perf_counter()
+        np.copyto(ring.slot(), source)
+        ring.commit(time.monotonic())
+        worst = max(worst, time.perf_counter() - start)
+    print(f"Flushing: worst frame {1000 * worst:.1f} ms of {1000 / FPS:.1f} ms, {ring.stalls} captures waited"
+          f" {1000 * ring.stallTime:.1f} ms in total")
+
+    while ring.flushing:
+        time.sleep(0.1)
+    print(f"Burst wrote {done[0]} frames")
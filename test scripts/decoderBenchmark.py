@@ -0,0 +1,122 @@
+import os
+import random
+import struct
+import time
+from pipedream import gyroscope
+from pipedream.decoder import DECODERS, SCALES, decode_batch
+from pipedream.gyroscope import GyroscopeHandler
+
+PACKETS = 200000
+REPEATS = 5 # Best of, for the reader timings
+
+def make_packet(dtype, values):
+    body = bytes([0x55, dtype]) + struct.pack('<hhhh', *values)
+    return body + bytes([sum(body) & 0xFF])
+
+def make_log():
+    rng = random.Random(1)
+    return b"".join(make_packet(0x51 + i % 3, [rng.randint(-32768, 32767) for _ in range(4)]) for i in range(PACKETS))
+
+def legacy_decode(log):
+    scale = {
+        0x51: 16.0 * 9.8 / 32768.0,
+        0x52: 2000.0 / 32768.0,
+        0x53: 180.0 / 32768.0
+    }
+    results = []
+    for i in range(0, len(log), 11):
+        packet = log[i:i + 11]
+        if (sum(packet[:10]) & 0xFF) != packet[10]:
+            continue
+        vals = struct.unpack('<hhh', packet[2:8])
+        results.append((packet[1], [v * scale[packet[1]] for v in vals]))
+    return results
+
+log = make_log()
+
+start = time.perf_counter()
+legacy = legacy_decode(log)
+legacyTime = time.perf_counter() - start
+
+start = time.perf_counter()
+samples = decode_batch(log, 0.0)
+batchTime = time.perf_counter() - start
+
+assert len(legacy) == len(samples)
+assert all(abs(a - b) < 1e-9 for a, b in zip(legacy[-1][1], samples[-1, 2:]))
+
+print(f"Legacy: {len(legacy) / legacyTime:>14,.0f} packets/s")
+print(f"Batch:  {len(samples) / batchTime:>14,.0f} packets/s ({legacyTime / batchTime:.0f}x)")
+
+# Serial sized chunks, as delivered by PacketFramer.aligned()
+for packets in (3, 30, 300):
+    chunk = log[:packets * 11]
+    loops = 20000 // packets
+    start = time.perf_counter()
+    for _ in range(loops):
+        decode_batch(chunk, 0.0)
+    elapsed = time.perf_counter() - start
+    print(f"Batch of {packets:>3}: {packets * loops / elapsed:>14,.0f} packets/s")
+
+# GyroscopeHandler.read_available at serial read sizes, struct decode below BATCH_PACKETS and NumPy above
+class LogSerial:
+    def __init__(self, log, readSize):
+        self.log = memoryview(log)
+        self.readSize = readSize
+        self.position = 0
+
+    @property
+    def in_waiting(self):
+        return min(self.readSize, len(self.log) - self.position)
+
+    def read(self, size):
+        data = self.log[self.position:self.position + size]
+        self.position += size
+        return bytes(data)
+
+def legacy_reader(log, readSize):
+    # Baseline read_serial_loop, one packet at a time out of a bytearray
+    gyro = GyroscopeHandler.__new__(GyroscopeHandler)
+    gyro.values = {dtype: [0.0] * decoder.size for dtype, decoder in DECODERS.items()}
+    gyro.zeroValues = {dtype: [0.0, 0.0, 0.0] for dtype in SCALES}
+    port = LogSerial(log, readSize)
+    buffer = bytearray()
+    for _ in range(len(log) // readSize):
+        buffer.extend(port.read(readSize))
+        while len(buffer) >= 11:
+            if buffer[0] == 0x55:
+                parsed = gyro.convert_hex(buffer[:11])
+                if parsed:
+                    dtype, value = parsed
+                    gyro.values[dtype] = value
+                    adjustedValues = [v - z for v, z in zip(gyro.values[dtype], gyro.zeroValues[dtype])]
+                buffer = buffer[11:]
+            else:
+                buffer.pop(0)
+
+def reader(log, readSize):
+    gyro.serial = LogSerial(log, readSize)
+    gyro.framer.reset()
+    for _ in range(len(log) // readSize):
+        gyro.read_available()
+
+master, slave = os.openpty()
+gyro = GyroscopeHandler(port=os.ttyname(slave), baud=115200)
+port = gyro.serial
+readerLog = log[:4096 * 11 * 5] # Whole reads at every size
+print()
+for readSize in (11, 33, 330, 4096):
+    for name, function, batchPackets in (("Legacy", legacy_reader, None), ("Batch only", reader, 0), ("Reader", reader, gyroscope.BATCH_PACKETS)):
+        if batchPackets is not None:
+            gyroscope.BATCH_PACKETS, default = batchPackets, gyroscope.BATCH_PACKETS
+        elapsed = float("inf")
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            function(readerLog, readSize)
+            elapsed = min(elapsed, time.perf_counter() - start)
+        if batchPackets is not None:
+            gyroscope.BATCH_PACKETS = default
+        print(f"{name:<10} {readSize:>5} B reads: {len(readerLog) // 11 / elapsed:>12,.0f} packets/s")
+gyro.serial = port
+gyro.stop()
+os.close(master)
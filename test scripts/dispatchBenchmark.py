@@ -0,0 +1,115 @@
+import math
+import random
+import time
+from collections import namedtuple
+from evdev import ecodes
+from pipedream.controller import COMMANDS, ControllerHandler
+from pipedream.valves import ValveManager
+
+# Run with GPIOZERO_PIN_FACTORY=mock to try it away from the craft
+EVENTS = 200000
+
+Event = namedtuple("Event", "type code value")
+
+class RecordedGamepad:
+    def __init__(self, events):
+        self.events = events
+
+    def read_loop(self):
+        return iter(self.events)
+
+def make_events():
+    # Circular sweeps of both sticks, one report per poll with a SYN after each like a real F310
+    rng = random.Random(1)
+    buttons = (ecodes.BTN_A, ecodes.BTN_B, ecodes.BTN_TL, ecodes.BTN_TR)
+    events = []
+    poll = 0
+    while len(events) < EVENTS:
+        angle = poll * 0.02
+        events.append(Event(ecodes.EV_ABS, ecodes.ABS_X, int(32767 * math.cos(angle))))
+        events.append(Event(ecodes.EV_ABS, ecodes.ABS_Y, int(32767 * math.sin(angle))))
+        events.append(Event(ecodes.EV_ABS, ecodes.ABS_RX, int(32767 * math.sin(0.7 * angle))))
+        if rng.random() < 0.05:
+            events.append(Event(ecodes.EV_KEY, rng.choice(buttons), rng.randint(0, 1)))
+        events.append(Event(ecodes.EV_SYN, ecodes.SYN_REPORT, 0))
+        poll += 1
+    return events
+
+def legacy_loop(events, handle):
+    # Sequential comparisons as controller_loop used to do them
+    for event in events:
+        if event.code == ecodes.BTN_SELECT:
+            handle(event.value)
+        if event.code == ecodes.BTN_START:
+            handle(event.value)
+        if event.code == ecodes.BTN_TL:
+            handle(event.value)
+        if event.code == ecodes.BTN_TR:
+            handle(event.value)
+        if event.code == ecodes.BTN_A:
+            handle(event.value)
+        if event.code == ecodes.BTN_B:
+            handle(event.value)
+        if event.code == ecodes.BTN_X:
+            handle(event.value)
+        if event.code == ecodes.BTN_Y:
+            handle(event.value)
+        if event.code == ecodes.BTN_THUMBL:
+            handle(event.value)
+        if event.code == ecodes.BTN_THUMBR:
+            handle(event.value)
+        if event.code == ecodes.ABS_Z:
+            handle(event.value)
+        if event.code == ecodes.ABS_RZ:
+            handle(event.value)
+        if event.type == ecodes.EV_ABS:
+            if event.code in (ecodes.ABS_X, ecodes.ABS_Y):
+                handle(event.value)
+            if event.code in (ecodes.ABS_RX, ecodes.ABS_RY):
+                handle(event.value)
+
+def table_loop(events, dispatch):
+    # Bare lookup in the table ControllerHandler builds, no report bookkeeping
+    for event in events:
+        handle = dispatch.get((event.type, event.code))
+        if handle:
+            handle(event.value)
+
+events = make_events()
+calls = []
+
+start = time.perf_counter()
+legacy_loop(events, calls.append)
+legacyTime = time.perf_counter() - start
+
+# Same events through the dispatch table, handlers replaced with the same stub
+handler = ControllerHandler(commandCallback=lambda command, state: None, valveManager=ValveManager(COMMANDS),
+                            device=RecordedGamepad(events))
+stubs = {key: calls.append for key in handler.dispatch}
+start = time.perf_counter()
+table_loop(events, stubs)
+dispatchTime = time.perf_counter() - start
+
+# Whole handle_event with the stubs: type filter, axis coalescing and one apply_report per SYN_REPORT
+handler.dispatch = stubs
+start = time.perf_counter()
+handler.controller_loop()
+reportTime = time.perf_counter() - start
+
+print(f"Legacy chain:   {len(events) / legacyTime:>12,.0f} events/s")
+print(f"Dispatch table: {len(events) / dispatchTime:>12,.0f} events/s ({legacyTime / dispatchTime:.1f}x)")
+print(f"handle_event:   {len(events) / reportTime:>12,.0f} events/s ({legacyTime / reportTime:.1f}x), lookup plus per report bookkeeping")
+
+# Real handlers, valve writes go to mock pins
+handler.dispatch = handler.build_dispatch(handler.buttonMap)
+handler.rawEvents = handler.appliedEvents = handler.reports = handler.decisions = handler.notifications = 0
+start = time.perf_counter()
+handler.controller_loop()
+fullTime = time.perf_counter() - start
+print(f"With handlers:  {len(events) / fullTime:>12,.0f} events/s, {handler.valves.writes} valve writes")
+stats = handler.stats()
+# Each report carries every axis once, so coalescing shows in the valve decisions and GUI notifications, not appliedEvents
+print(f"Coalescing: {stats['rawEvents']} raw events in {stats['reports']} reports -> {stats['decisions']} valve decisions"
+      f" ({stats['decisions'] / stats['rawEvents']:.1%}), {stats['notifications']} GUI notifications"
+      f" ({stats['notifications'] / stats['rawEvents']:.1%})")
+handler.valves.close()
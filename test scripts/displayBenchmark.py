@@ -0,0 +1,50 @@
+import time
+import tkinter as tk
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+from pipedream.display import FrameDisplay
+
+FRAMES = 300
+CAMERA_SIZE = (1280, 720)
+LABEL_SIZE = (640, 360)
+
+def make_frames():
+    frames = []
+    for i in range(8):
+        frame = np.random.default_rng(i).integers(0, 255, (CAMERA_SIZE[1], CAMERA_SIZE[0], 3), dtype=np.uint8)
+        frames.append(frame)
+    return frames
+
+def legacy_show(label, frame):
+    # Previous CameraFeed path, plus the downscale needed to fit the label
+    frame = cv2.resize(frame, LABEL_SIZE)
+    image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    imgtk = ImageTk.PhotoImage(image)
+    label.imgtk = imgtk
+    label.config(image=imgtk)
+
+def run(name, root, show, frames):
+    start = time.perf_counter()
+    cpuStart = time.process_time()
+    for i in range(FRAMES):
+        show(frames[i % len(frames)])
+        root.update_idletasks()
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpuStart
+    print(f"{name:<8} {FRAMES / elapsed:>8.1f} frames/s  {1000 * cpu / FRAMES:>6.2f} ms CPU/frame")
+
+root = tk.Tk()
+frames = make_frames()
+
+legacyLabel = tk.Label(root)
+legacyLabel.pack()
+run("Legacy", root, lambda frame: legacy_show(legacyLabel, frame), frames)
+legacyLabel.destroy()
+
+label = tk.Label(root)
+label.pack()
+display = FrameDisplay(label, LABEL_SIZE)
+run("Reused", root, display.show, frames)
+
+root.destroy()
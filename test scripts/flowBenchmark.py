@@ -0,0 +1,27 @@
+import time
+import cv2
+import numpy as np
+from pipedream.vision import OpticalFlowEstimator
+
+FRAMES = 300
+FRAME_SIZE = (640, 480)
+SHIFT = 2 # Pixels per frame at full resolution
+FPS = 30.0
+
+class StaticCamera:
+    latest = (None, 0.0, 0)
+
+# Textured scene that slides left a few pixels every frame
+rng = np.random.default_rng(0)
+scene = cv2.GaussianBlur(rng.integers(0, 255, (FRAME_SIZE[1], FRAME_SIZE[0] + SHIFT * FRAMES, 3), dtype=np.uint8), (5, 5), 0)
+frames = [np.ascontiguousarray(scene[:, i * SHIFT:i * SHIFT + FRAME_SIZE[0]]) for i in range(FRAMES)]
+
+estimator = OpticalFlowEstimator(StaticCamera(), distance=1.0)
+start = time.perf_counter()
+for i, frame in enumerate(frames):
+    estimator.process(frame, i / FPS)
+elapsed = time.perf_counter() - start
+
+print(f"{FRAMES / elapsed:.1f} frames/s ({1000 * elapsed / FRAMES:.2f} ms/frame), camera needs {FPS:.0f}")
+print(f"Feature detections: {estimator.detections}, tracked: {estimator.values[2]}")
+print(f"Estimated velocity: vx {estimator.values[0]:+.3f} m/s, vy {estimator.values[1]:+.3f} m/s")
@@ -0,0 +1,91 @@
+import random
+import struct
+import time
+import numpy as np
+from pipedream.decoder import frame_view
+from pipedream.framer import PacketFramer
+from pipedream.gyroscope import BATCH_PACKETS
+
+PACKETS = 50000
+CHUNKS = [33, 4096, 65536] # Bytes per serial read
+REPEATS = 3 # Best of
+
+def make_packet(dtype, values):
+    body = bytes([0x55, dtype]) + struct.pack('<hhhh', *values)
+    return body + bytes([sum(body) & 0xFF])
+
+def make_stream(corruption):
+    rng = random.Random(1)
+    stream = bytearray()
+    for i in range(PACKETS):
+        packet = bytearray(make_packet(0x51 + i % 3, [rng.randint(-32768, 32767) for _ in range(4)]))
+        if rng.random() < corruption:
+            # Line noise: flip a byte and inject a burst of garbage
+            packet[rng.randrange(11)] ^= 0xFF
+            stream.extend(bytes(rng.randrange(256) for _ in range(rng.randint(1, 40))))
+        stream.extend(packet)
+    return bytes(stream)
+
+def legacy_parser(stream, chunk):
+    buffer = bytearray()
+    count = 0
+    for i in range(0, len(stream), chunk):
+        buffer.extend(stream[i:i + chunk])
+        while len(buffer) >= 11:
+            if buffer[0] == 0x55:
+                packet = buffer[:11]
+                if (sum(packet[:10]) & 0xFF) == packet[10]:
+                    count += 1
+                buffer = buffer[11:]
+            else:
+                buffer.pop(0)
+    return count
+
+def framer_parser(stream, chunk):
+    framer = PacketFramer(capacity=max(8192, 2 * chunk))
+    count = 0
+    for i in range(0, len(stream), chunk):
+        framer.feed(stream[i:i + chunk])
+        for frame in framer.frames():
+            count += 1
+    return count
+
+def count_valid(chunk):
+    # aligned() checks only the first checksum, the reader checks the rest as it decodes
+    if len(chunk) < BATCH_PACKETS * 11:
+        chunk = bytes(chunk)
+        count = 0
+        for offset in range(0, len(chunk), 11):
+            if (sum(chunk[offset:offset + 10]) & 0xFF) == chunk[offset + 10]:
+                count += 1
+        return count
+    raw = frame_view(chunk)
+    return int(np.count_nonzero((raw[:, :-1].sum(axis=1, dtype=np.uint16) & 0xFF) == raw[:, -1]))
+
+def aligned_parser(stream, chunk):
+    # What GyroscopeHandler.read_available runs: whole runs of aligned packets per read
+    framer = PacketFramer(capacity=max(8192, 2 * chunk))
+    count = 0
+    for i in range(0, len(stream), chunk):
+        framer.feed(stream[i:i + chunk])
+        frames = framer.aligned()
+        while frames:
+            count += count_valid(frames)
+            frames = framer.aligned() if len(framer) >= 11 else None
+    return count
+
+def run(name, parser, stream, chunk):
+    elapsed = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        count = parser(stream, chunk)
+        elapsed = min(elapsed, time.perf_counter() - start)
+    print(f"{name:<8} {chunk:>5} B reads {count:>7} packets  {count / elapsed:>12,.0f} packets/s")
+
+for label, corruption in [("Clean", 0.0), ("Corrupted (5%)", 0.05), ("Corrupted (25%)", 0.25)]:
+    stream = make_stream(corruption)
+    print(f"\n{label}: {len(stream)} bytes")
+    for chunk in CHUNKS:
+        run("Legacy", legacy_parser, stream, chunk)
+        run("Framer", framer_parser, stream, chunk)
+        run("Aligned", aligned_parser, stream, chunk)
@@ -0,0 +1,65 @@
+import os
+import threading
+import time
+
+# Mock pins have to be chosen before pipedream claims them
+os.environ.setdefault("GPIOZERO_PIN_FACTORY", "mock")
+
+from pipedream.attitude import MadgwickFilter
+from pipedream.bus import TelemetryBus
+from pipedream.camera import CameraFeed
+from pipedream.controller import COMMANDS, ControllerHandler
+from pipedream.core import DeviceCore
+from pipedream.gyroscope import GyroscopeHandler
+from pipedream.simulation import FakeWitMotion, ScriptedGamepad, SyntheticCapture, stick_script
+from pipedream.valves import ValveManager
+
+# Every device simulated at craft data rates, driven from one asyncio loop without a window
+SECONDS = 10
+IMU_RATE = 200
+
+bus = TelemetryBus()
+logger = bus.subscribe(["imu.*", "cmd.*"], mode="fifo", maxQueue=256)
+logged = []
+display = bus.subscribe(["imu.attitude", "cmd.active", "camera.frame"])
+
+imu = FakeWitMotion(rate=IMU_RATE, types=(0x51, 0x52, 0x53, 0x54)).start()
+gamepad = ScriptedGamepad(stick_script(2000), repeat=True)
+valves = ValveManager(COMMANDS)
+
+controller = ControllerHandler(valveManager=valves, device=gamepad, bus=bus)
+gyro = GyroscopeHandler(port=imu.port, attitudeFilter=MadgwickFilter(), bus=bus)
+camera = CameraFeed(SyntheticCapture(), bus=bus)
+
+core = DeviceCore()
+core.add_controller(controller)
+core.add_gyroscope(gyro)
+core.add_camera(camera)
+threading.Timer(SECONDS, core.stop).start()
+
+def log_loop():
+    # Consumer on its own thread, as a file logger would be
+    while core.stopping is None or not core.stopping.is_set():
+        logged.extend(logger.get(timeout=0.1))
+
+threading.Thread(target=log_loop, daemon=True).start()
+
+start = time.monotonic()
+core.run()
+elapsed = time.monotonic() - start
+
+logged.extend(logger.poll())
+stats = imu.stats()
+print(f"IMU:        {stats['packetRate']:.0f} packets/s sent, {stats['overruns']} overruns, "
+      f"{sum(1 for message in logged if message.topic == 'imu.samples')} batches logged")
+print(f"Gamepad:    {gamepad.sentReports / elapsed:.0f} reports/s, {controller.reports} applied, {valves.writes} valve writes")
+print(f"Camera:     {camera.capturedFrames / elapsed:.1f} frames/s captured at {camera.fps:.0f} fps")
+print(f"Attitude:   {', '.join(f'{value:+.1f}' for value in gyro.attitude())} deg")
+print(f"Event loop: lag {1000 * core.loopLag:.2f} ms, max {1000 * core.maxLoopLag:.2f} ms, shutdown {1000 * core.shutdownTime:.1f} ms")
+print(f"Bus:        {bus.stats()['published']}")
+print(f"Subscribers: logger dropped {logger.dropped}, display dropped {display.dropped} (latest value only)")
+
+camera.release()
+gyro.stop()
+valves.close()
+imu.stop()
@@ -0,0 +1,22 @@
+import time
+from pipedream.controller import COMMANDS
+from pipedream.thrust import ThrustScheduler
+from pipedream.valves import ValveManager
+
+# Run with GPIOZERO_PIN_FACTORY=mock to try it away from the craft
+PERIOD = 0.1
+CYCLES = 20
+
+valves = ValveManager(COMMANDS)
+scheduler = ThrustScheduler(valves, period=PERIOD)
+scheduler.start()
+for duty in (0.05, 0.15, 0.3, 0.5, 0.7, 0.9, 1.0):
+    scheduler.set_duty("Ascend", duty)
+    time.sleep(PERIOD * CYCLES)
+    stats = scheduler.stats()
+    actual = stats["actualDuties"].get("Ascend", 0.0)
+    print(f"Commanded {duty:.2f}  actual {actual:.3f}  jitter {1000 * stats['jitter']:.2f} ms"
+          f"  max {1000 * stats['maxJitter']:.2f} ms  overruns {stats['overruns']}")
+scheduler.stop()
+print(valves.stats())
+valves.close()